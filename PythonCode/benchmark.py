@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import time
+import random
+import platform
+import resource
+import statistics
+import tracemalloc
+from contextlib import redirect_stdout
+from udcc import *
+from test_udcc import ds_range, datasets, decomp_names, base_dir
+
+# Benchmark suite: every heuristic is run on the bundled datasets (and POST_UDCC on their
+# decompositions) at representative mur values, i.e., the first, middle and last one of ds_range.
+# Each run is repeated after some warm-up runs, recording wall and CPU time of building the state
+# (from a base loaded once) and mining, plus the peak memory allocated by Python (tracemalloc,
+# in a further run, since tracing slows the run down) and the peak RSS of the process so far.
+#
+#   python benchmark.py run results.json [dataset ...]     run the suite (optionally on some datasets)
+#   python benchmark.py compare baseline.json results.json [threshold]
+#
+# compare flags the runs whose wall time (the minimum over the repeats, the least noisy measure)
+# or tracemalloc peak grew by more than threshold (default 0.25, i.e., 25%) with respect to the
+# baseline, as well as the runs whose WSC changed, and exits with status 1 if there is any
+
+heuristics = {'UDCC_1': lambda base, mur: UDCC_1.from_base(base, mur),
+              'UDCC_2': lambda base, mur: UDCC_2.from_base(base, mur),
+              'UDCC_RM_1': lambda base, mur: UDCC_RM_1.from_base(base, mur),
+              'UDCC_RM_2': lambda base, mur: UDCC_RM_2.from_base(base, mur),
+              'STRICT_UDCC': lambda base, mur: STRICT_UDCC.from_base(base, mur, access_matrix='unc_upa'),
+              'STRICT_UDCC_REDUCE': lambda base, mur: STRICT_UDCC_REDUCE.from_base(base, mur, access_matrix='unc_upa')}
+
+post_heuristics = {'POST_UDCC': lambda state, mur: POST_UDCC(state, mur),
+                   'POST_UDCC_REDUCE': lambda state, mur: POST_UDCC(state, mur, True)}
+
+min_time = 0.01  # runs faster than this (seconds) are too noisy to be flagged by compare
+
+
+def representative_murs(dataset):
+    murs = ds_range[dataset]
+    return sorted({murs[0], murs[len(murs) // 2], murs[-1]})
+
+
+def run_once(build, base, mur):
+    random.seed(0)  # STRICT_UDCC draws random roles
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    state = build(base, mur)
+    state.mine()
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    return wall, cpu, state.get_wsc()[0]
+
+
+def measure(build, base, mur, repeats, warmup):
+    for _ in range(warmup):
+        run_once(build, base, mur)
+    walls = list()
+    cpus = list()
+    for _ in range(repeats):
+        wall, cpu, wsc = run_once(build, base, mur)
+        walls.append(wall)
+        cpus.append(cpu)
+
+    tracemalloc.start()
+    run_once(build, base, mur)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'wsc': wsc,
+            'wall': statistics.median(walls),
+            'wall_min': min(walls),
+            'cpu': statistics.median(cpus),
+            'cpu_min': min(cpus),
+            'peak_memory': peak,
+            'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}  # KiB on Linux
+
+
+def run(output, selected=None, repeats=5, warmup=1):
+    results = dict()  # key: dataset/heuristic/mur[/decomposition] - value: measures
+    for dataset in selected or datasets:
+        base = Mining.load_base('datasets/' + dataset + '.txt')
+        states = dict()
+        for decomposition in decomp_names:
+            if dataset == 'customer' and 'optimal' in decomposition:
+                continue
+            states[decomposition] = POST(base_dir + dataset + decomposition)
+
+        for mur in representative_murs(dataset):
+            for name, build in heuristics.items():
+                key = f'{dataset}/{name}/{mur}'
+                with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):  # STRICT_UDCC_REDUCE prints
+                    results[key] = measure(build, base, mur, repeats, warmup)
+                print(f'{dataset:>15} {name:>20} {mur:>5} {results[key]["wall"]:>9.4f}')
+            for name, build in post_heuristics.items():
+                for decomposition, state in states.items():
+                    key = f'{dataset}/{name}/{mur}/{decomposition[1:-4]}'
+                    results[key] = measure(build, state, mur, repeats, warmup)
+                print(f'{dataset:>15} {name:>20} {mur:>5} {len(states):>3} decompositions')
+
+    with open(output, 'w') as f:
+        json.dump({'python': platform.python_version(),
+                   'platform': platform.platform(),
+                   'repeats': repeats,
+                   'warmup': warmup,
+                   'results': results}, f, indent=2)
+    return results
+
+
+def compare(baseline, current, threshold=0.25):
+    # runs (in both files) slower or using more memory than the baseline by more than threshold
+    with open(baseline) as f:
+        old = json.load(f)['results']
+    with open(current) as f:
+        new = json.load(f)['results']
+
+    flagged = list()
+    for key in sorted(old.keys() & new.keys()):
+        o = old[key]
+        n = new[key]
+        reasons = list()
+        old_wall = o['wall_min']
+        new_wall = n['wall_min']
+        if max(old_wall, new_wall) >= min_time and new_wall > old_wall * (1 + threshold):
+            reasons.append(f'wall {old_wall:.4f}s -> {new_wall:.4f}s ({new_wall / old_wall - 1:+.0%})')
+        if n['peak_memory'] > o['peak_memory'] * (1 + threshold):
+            reasons.append(f'peak memory {o["peak_memory"]} -> {n["peak_memory"]} '
+                           f'({n["peak_memory"] / o["peak_memory"] - 1:+.0%})')
+        if o['wsc'] != n['wsc']:
+            reasons.append(f'WSC {o["wsc"]} -> {n["wsc"]}')
+        if reasons:
+            flagged.append(key)
+            print(f'{key:<45}', '; '.join(reasons))
+
+    missing = old.keys() - new.keys()
+    if missing:
+        print(len(missing), 'runs of the baseline are not in', current)
+    print(len(flagged), 'regressions out of', len(old.keys() & new.keys()), 'runs')
+    return flagged
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == 'run':
+        run(sys.argv[2], sys.argv[3:])
+    elif len(sys.argv) > 3 and sys.argv[1] == 'compare':
+        flagged = compare(sys.argv[2], sys.argv[3], float(sys.argv[4]) if len(sys.argv) > 4 else 0.25)
+        sys.exit(1 if flagged else 0)
+    else:
+        print('usage: python benchmark.py run results.json [dataset ...]')
+        print('       python benchmark.py compare baseline.json results.json [threshold]')
@@ -1,6 +1,718 @@
+import hashlib
+import heapq
+import inspect
+import json
+import mmap
+import os
+import pickle
+import random
+import struct
+import sys
+import time
+import zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 from copy import deepcopy
+from itertools import chain
+
+try:  # optional: verify solutions through sparse matrix products (see grants)
+    import numpy
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+
+def from_bits(mask):
+    # set of the positions of the bits set in mask
+    items = set()
+    while mask:
+        low = mask & -mask
+        items.add(low.bit_length() - 1)
+        mask ^= low
+    return items
+
+
+# binary caches of the text files in datasets/ (and decompositions/), stored next to them
+CACHE_SUFFIX = '.cache'
+CACHE_MAGIC = b'RMCACHE1'
+CHECKPOINT_MAGIC = b'RMCKPT03'
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).digest()
+
+
+def pack_header(digest, arrays):
+    # header preceding the int32 arrays: magic, digest of the file they have been computed
+    # from, byte order, number of arrays and their lengths
+    header = struct.pack('<8s20scxxxI', CACHE_MAGIC, digest, sys.byteorder[0].encode(), len(arrays))
+    return header + struct.pack('<%dQ' % len(arrays), *map(len, arrays))
+
+
+def unpack_arrays(buffer, digest=None):
+    # views on the arrays stored in buffer after their header, None if the header is not valid
+    # (or, if digest is given, the arrays have been computed from another file)
+    size = struct.calcsize('<8s20scxxxI')
+    try:
+        magic, stored, order, n = struct.unpack_from('<8s20scxxxI', buffer)
+        lengths = struct.unpack_from('<%dQ' % n, buffer, size)
+    except struct.error:
+        return None
+    if magic != CACHE_MAGIC or order != sys.byteorder[0].encode() or digest not in (None, stored):
+        return None
+    offset = size + 8 * n
+    arrays = list()
+    for length in lengths:
+        arrays.append(memoryview(buffer)[offset:offset + 4 * length].cast('i'))
+        offset += 4 * length
+    return arrays
+
+
+def write_arrays(path, digest, arrays):
+    # store the int32 arrays, along with the digest of the file they have been computed from
+    tmp = path + '.' + str(os.getpid())
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(pack_header(digest, arrays))
+            for a in arrays:
+                f.write(array('i', a).tobytes())
+        os.replace(tmp, path)
+    except OSError:  # e.g., read-only directory: just go on without cache
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def read_arrays(path, digest):
+    # memory-map the arrays stored by write_arrays, None if there is no cache for digest
+    try:
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    arrays = unpack_arrays(mm, digest)
+    if arrays is None:
+        mm.close()
+    return arrays
+
+
+def load_arrays(path, compile):
+    # arrays computed by compile(path), read from the binary cache of path if it is up to date
+    cache = path + CACHE_SUFFIX
+    digest = file_digest(path)
+    arrays = read_arrays(cache, digest)
+    if arrays is None:
+        arrays = compile(path)
+        write_arrays(cache, digest, arrays)
+    return arrays
+
+
+class SharedArrays:
+    # int32 arrays (laid out as in the binary caches) published in a block of shared memory, so
+    # that several processes can load a dataset (see Mining) or an RBAC state (see POST) from
+    # them without reading and parsing the file. This only speeds up loading: Mining and POST
+    # build their own rows (sets) from the arrays and never read the block afterwards, so each
+    # process still holds a full copy of UPA/PUA (or UA/PA), and the block can be closed once
+    # loaded. Instances are pickled by name: unpickling (e.g., in a worker process) attaches to the block
+    def __init__(self, name, source=''):
+        self.source = source  # what the arrays represent, e.g., the file they have been computed from
+        self._shm = shared_memory.SharedMemory(name)
+        self.arrays = unpack_arrays(self._shm.buf)
+
+    @staticmethod
+    def publish(arrays, source=''):
+        # copy arrays to a new block, which has to be unlinked by the caller when no longer needed
+        header = pack_header(bytes(20), arrays)
+        shm = shared_memory.SharedMemory(create=True, size=len(header) + 4 * sum(map(len, arrays)))
+        shm.buf[:len(header)] = header
+        offset = len(header)
+        for a in arrays:
+            data = array('i', a).tobytes()
+            shm.buf[offset:offset + len(data)] = data
+            offset += len(data)
+        shared = SharedArrays.__new__(SharedArrays)
+        shared.source = source
+        shared._shm = shm
+        shared.arrays = unpack_arrays(shm.buf)
+        return shared
+
+    def __reduce__(self):
+        return SharedArrays, (self._shm.name, self.source)
+
+    def close(self):
+        if self.arrays is not None:  # views have to be released before the block is closed
+            for a in self.arrays:
+                a.release()
+            self.arrays = None
+            self._shm.close()
+
+    def __del__(self):
+        self.close()
+
+    def unlink(self):
+        self._shm.unlink()
+
+
+class ResultCache:
+    # on-disk cache of the results of heuristic runs (e.g., metrics and UA/PA/DUPA), one compressed
+    # file per run, named after the digest of: content of the dataset (or decomposition) file,
+    # source files of the heuristic (i.e., the modules defining it and the classes it inherits
+    # from, e.g., udcc.py and library.py), its parameters and version. Least recently used
+    # results are evicted once the files exceed max_size bytes
+    version = 1  # bump to invalidate the results computed so far (e.g., after changing what is stored)
+
+    def __init__(self, directory='results_cache', max_size=1 << 30):
+        self._directory = directory
+        self._max_size = max_size
+        self._digests = dict()  # key: (path, size, modification time) - value: digest of the file at path
+        self._sources = dict()  # key: heuristic - value: digest of its source files
+
+    def key(self, path, heuristic, **params):
+        stat = os.stat(path)
+        if (path, stat.st_size, stat.st_mtime_ns) not in self._digests:
+            self._digests[(path, stat.st_size, stat.st_mtime_ns)] = file_digest(path)
+        if heuristic not in self._sources:
+            # whole files rather than the classes alone, as these also depend on module-level
+            # code (e.g., SupersetIndex, LazyHeap)
+            source = hashlib.sha1()
+            for f in sorted({inspect.getsourcefile(c) for c in heuristic.__mro__
+                             if c.__module__ not in ('builtins', 'abc')}):
+                source.update(file_digest(f))
+            self._sources[heuristic] = source.digest()
+        h = hashlib.sha1(self._digests[(path, stat.st_size, stat.st_mtime_ns)] + self._sources[heuristic])
+        h.update(repr((heuristic.__name__, sorted(params.items()), self.version)).encode())
+        return h.hexdigest()
+
+    def get(self, key):
+        # result stored under key, None if there is no such result
+        path = os.path.join(self._directory, key)
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.loads(zlib.decompress(f.read()))
+            os.utime(path)  # mark as recently used
+        except (OSError, zlib.error, pickle.UnpicklingError, EOFError):
+            return None
+        return result
+
+    def put(self, key, result):
+        os.makedirs(self._directory, exist_ok=True)
+        path = os.path.join(self._directory, key)
+        tmp = path + '.' + str(os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(zlib.compress(pickle.dumps(result, pickle.HIGHEST_PROTOCOL)))
+        os.replace(tmp, path)
+        self._evict()
+
+    def _evict(self):
+        entries = list()
+        for name in os.listdir(self._directory):
+            try:
+                stat = os.stat(os.path.join(self._directory, name))
+            except OSError:  # removed by another process
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, name))
+        size = sum(e[1] for e in entries)
+        for _, s, name in sorted(entries):
+            if size <= self._max_size:
+                break
+            try:
+                os.remove(os.path.join(self._directory, name))
+            except OSError:
+                pass
+            size -= s
+
+
+def compile_upa(path):
+    # CSR representation of the UPA in the text file at path: users (in order of first
+    # appearance), offsets of their permissions and permissions (both in order of first
+    # appearance), then the same arrays for the transpose (i.e., PUA)
+    upa = dict()  # dictionaries are used as sets keeping the insertion order
+    pua = dict()
+    with open(path) as f:
+        for u_p in f:
+            (user, permission) = u_p.split()
+            user = int(user)
+            permission = int(permission)
+            if user in upa:
+                upa[user][permission] = None
+            else:
+                upa[user] = {permission: None}
+            if permission in pua:
+                pua[permission][user] = None
+            else:
+                pua[permission] = {user: None}
+
+    arrays = list()
+    for rows in (upa, pua):
+        offsets = [0]
+        for row in rows.values():
+            offsets.append(offsets[-1] + len(row))
+        arrays.extend([list(rows), offsets, [i for row in rows.values() for i in row]])
+    return arrays
+
+
+def compile_decomposition(path):
+    # CSR representation of the RBAC state in the text file at path: roles (in file order),
+    # offsets of their permissions and permissions, offsets of their users and users
+    roles = list()
+    pa_offsets = [0]
+    pa = list()
+    ua_offsets = [0]
+    ua = list()
+    with open(path) as f:
+        for line in f:
+            (key, _, value) = line.partition(':')
+            key = key.strip()
+            if key == 'role':
+                if len(ua_offsets) < len(pa_offsets):  # previous role without users
+                    ua_offsets.append(len(ua))
+                roles.append(int(value))
+            elif key == 'permissions':
+                pa.extend(map(int, value.split(',')))
+                pa_offsets.append(len(pa))
+            elif key == 'users':
+                ua.extend(map(int, value.split(',')))
+                ua_offsets.append(len(ua))
+    if len(ua_offsets) < len(pa_offsets):
+        ua_offsets.append(len(ua))
+    return [roles, pa_offsets, pa, ua_offsets, ua]
+
+
+def grants(ua, pa=None):
+    # sparse boolean matrix (users x permissions) of the permissions granted to each user through
+    # the roles in ua (dictionary (user, set of roles)) and pa, or directly by ua if pa is None.
+    # Matrices are indexed by identifiers, see fit to compare them
+    def matrix(rows, n_cols=0):
+        keys = list(rows)
+        lengths = numpy.fromiter(map(len, rows.values()), dtype=numpy.int64, count=len(keys))
+        r = numpy.repeat(numpy.array(keys, dtype=numpy.int64), lengths)
+        c = numpy.fromiter(chain.from_iterable(rows.values()), dtype=numpy.int64, count=int(lengths.sum()))
+        shape = (int(r.max(initial=-1)) + 1, max(int(c.max(initial=-1)) + 1, n_cols))
+        return sparse.csr_matrix((numpy.ones(len(c), dtype=numpy.int32), (r, c)), shape=shape)
+
+    if pa is None:
+        return matrix(ua).astype(bool)
+    pa_matrix = matrix(pa)
+    ua_matrix = matrix(ua, pa_matrix.shape[0])
+    pa_matrix.resize((ua_matrix.shape[1], pa_matrix.shape[1]))
+    return (ua_matrix @ pa_matrix).astype(bool)
+
+
+def fit(*matrices):
+    # resize (in place) the matrices built by grants to their common shape
+    shape = tuple(map(max, zip(*(m.shape for m in matrices))))
+    for m in matrices:
+        m.resize(shape)
+    return matrices
+
+
+def differing_users(a, b):
+    # users (rows) having different permissions in the matrices a and b (see grants)
+    a, b = fit(a, b)
+    return set(numpy.unique((a != b).nonzero()[0]).tolist())
+
+
+class Solution:
+    # RBAC state (e.g., the one mined by a heuristic, see Mining.solution) held by CSR int32
+    # arrays rather than dictionaries of sets: roles and the offsets of their permissions in pa,
+    # users and the offsets of their roles in ua and of their direct permissions in dupa. It can
+    # be written to (and read from) the text format of decompositions/, DUPA being listed after
+    # the roles as 'user'/'dupa' entries (ignored by compile_decomposition), or a binary file laid
+    # out as the caches, which is memory-mapped when read. POST takes it as starting state
+    __slots__ = ('source', 'roles', 'pa_offsets', 'pa', 'users', 'ua_offsets', 'ua', 'dupa_offsets', 'dupa')
+    sparse_checks = sparse is not None  # verify through sparse matrices (see grants), if SciPy is available
+
+    def __init__(self, roles, pa_offsets, pa, users, ua_offsets, ua, dupa_offsets, dupa, source=''):
+        self.source = source  # what the solution has been computed from, e.g., the dataset file
+        arrays = [a if isinstance(a, (array, memoryview)) else array('i', a)
+                  for a in (roles, pa_offsets, pa, users, ua_offsets, ua, dupa_offsets, dupa)]
+        (self.roles, self.pa_offsets, self.pa, self.users, self.ua_offsets, self.ua,
+         self.dupa_offsets, self.dupa) = arrays
+
+    @staticmethod
+    def from_dicts(ua, pa, dupa=None, source=''):
+        # solution having ua (dictionary (user, set of roles)), pa (dictionary (role, set of
+        # permissions)) and dupa (dictionary (user, set of permissions)), listed in their order
+        dupa = dupa or dict()
+        pa_offsets = array('i', [0])
+        pa_values = array('i')
+        for prms in pa.values():
+            pa_values.extend(prms)
+            pa_offsets.append(len(pa_values))
+        users = array('i', ua)
+        users.extend(u for u in dupa if u not in ua)
+        ua_offsets = array('i', [0])
+        ua_values = array('i')
+        dupa_offsets = array('i', [0])
+        dupa_values = array('i')
+        for u in users:
+            ua_values.extend(ua.get(u, ()))
+            ua_offsets.append(len(ua_values))
+            dupa_values.extend(dupa.get(u, ()))
+            dupa_offsets.append(len(dupa_values))
+        return Solution(array('i', pa), pa_offsets, pa_values, users, ua_offsets, ua_values,
+                        dupa_offsets, dupa_values, source)
+
+    def arrays(self):
+        return [self.roles, self.pa_offsets, self.pa, self.users, self.ua_offsets, self.ua,
+                self.dupa_offsets, self.dupa]
+
+    @staticmethod
+    def _rows(keys, offsets, values):
+        # dictionary (key, set of values) of the keys having values
+        rows = dict()
+        for i, k in enumerate(keys):
+            if offsets[i] < offsets[i + 1]:
+                rows[k] = set(values[offsets[i]:offsets[i + 1]])
+        return rows
+
+    def get_ua(self):
+        return self._rows(self.users, self.ua_offsets, self.ua)
+
+    def get_pa(self):
+        return self._rows(self.roles, self.pa_offsets, self.pa)
+
+    def get_dupa(self):
+        return self._rows(self.users, self.dupa_offsets, self.dupa)
+
+    def get_wsc(self):
+        nroles = len(self.roles)
+        return nroles + len(self.ua) + len(self.pa), nroles, len(self.ua), len(self.pa)
+
+    def decomposition(self):
+        # CSR arrays of the roles as compile_decomposition returns them (i.e., users by role)
+        role_users = {r: [] for r in self.roles}
+        for i, u in enumerate(self.users):
+            for r in self.ua[self.ua_offsets[i]:self.ua_offsets[i + 1]]:
+                role_users[r].append(u)
+        ua_offsets = [0]
+        for usrs in role_users.values():
+            ua_offsets.append(ua_offsets[-1] + len(usrs))
+        return [self.roles, self.pa_offsets, self.pa, ua_offsets, list(chain.from_iterable(role_users.values()))]
+
+    def write(self, path):
+        # write the solution in the text format of decompositions/
+        roles, pa_offsets, pa, ua_offsets, ua = self.decomposition()
+        with open(path, 'w') as f:
+            for i, r in enumerate(roles):
+                f.write('role: ' + str(r) + '\n')
+                f.write('permissions: ' + ', '.join(map(str, pa[pa_offsets[i]:pa_offsets[i + 1]])) + '\n')
+                if ua_offsets[i] < ua_offsets[i + 1]:
+                    f.write('users: ' + ', '.join(map(str, ua[ua_offsets[i]:ua_offsets[i + 1]])) + '\n')
+                f.write('\n')
+            for i, u in enumerate(self.users):
+                if self.dupa_offsets[i] < self.dupa_offsets[i + 1]:
+                    f.write('user: ' + str(u) + '\n')
+                    f.write('dupa: ' + ', '.join(map(str, self.dupa[self.dupa_offsets[i]:self.dupa_offsets[i + 1]])) + '\n')
+                    f.write('\n')
+
+    def save(self, path):
+        # write the solution in binary format (see load)
+        arrays = self.arrays()
+        tmp = path + '.' + str(os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(pack_header(bytes(20), arrays))
+            for a in arrays:
+                f.write(a.tobytes())
+        os.replace(tmp, path)
+
+    @staticmethod
+    def load(path):
+        # solution in the file at path, either binary (see save) or text (see write)
+        with open(path, 'rb') as f:
+            binary = f.read(len(CACHE_MAGIC)) == CACHE_MAGIC
+        if not binary:
+            return Solution.read(path)
+        arrays = read_arrays(path, None)
+        if arrays is None or len(arrays) != 8:
+            raise Exception('Solution error: wrong format')
+        return Solution(*arrays, source=path)
+
+    @staticmethod
+    def read(path):
+        # solution in the text file at path (see write). Users are listed in order of first
+        # appearance, so the users of a role may be listed (see decomposition) in another order
+        # than in the file, and POST_UDCC may break ties differently than on the file itself
+        ua = dict()
+        pa = dict()
+        dupa = dict()
+        role = user = None
+        with open(path) as f:
+            for line in f:
+                (key, _, value) = line.partition(':')
+                key = key.strip()
+                if key == 'role':
+                    role = int(value)
+                    pa[role] = list()
+                elif key == 'permissions':
+                    pa[role].extend(map(int, value.split(',')))
+                elif key == 'users':
+                    for u in map(int, value.split(',')):
+                        if u in ua:
+                            ua[u].append(role)
+                        else:
+                            ua[u] = [role]
+                elif key == 'user':
+                    user = int(value)
+                elif key == 'dupa':
+                    dupa[user] = list(map(int, value.split(',')))
+        return Solution.from_dicts(ua, pa, dupa, path)
+
+    def grants(self):
+        # sparse boolean matrix (users x permissions) of the permissions granted to each user by
+        # its roles and DUPA, indexed by identifiers as the ones built by grants. Computed from
+        # the arrays as they are, without building dictionaries
+        def vector(a):
+            return numpy.frombuffer(a, dtype=numpy.int32).astype(numpy.int64)
+
+        roles = vector(self.roles)
+        order = numpy.argsort(roles)
+        ua = order[numpy.searchsorted(roles, vector(self.ua), sorter=order)]  # roles as indices of roles
+        pa = vector(self.pa)
+        dupa = vector(self.dupa)
+        n_users = len(self.users)
+        n_cols = int(max(pa.max(initial=-1), dupa.max(initial=-1))) + 1
+        ua_matrix = sparse.csr_matrix((numpy.ones(len(ua), dtype=numpy.int32), ua, vector(self.ua_offsets)),
+                                      shape=(n_users, len(roles)))
+        pa_matrix = sparse.csr_matrix((numpy.ones(len(pa), dtype=numpy.int32), pa, vector(self.pa_offsets)),
+                                      shape=(len(roles), n_cols))
+        dupa_matrix = sparse.csr_matrix((numpy.ones(len(dupa), dtype=numpy.int32), dupa, vector(self.dupa_offsets)),
+                                        shape=(n_users, n_cols))
+        granted = (ua_matrix @ pa_matrix + dupa_matrix).tocoo()  # rows are indices of users
+        users = vector(self.users)
+        shape = (int(users.max(initial=-1)) + 1, n_cols)
+        return sparse.csr_matrix((granted.data, (users[granted.row], granted.col)), shape=shape).astype(bool)
+
+    def wrong_users(self, upa):
+        # users whose permissions, as granted by roles and DUPA, differ from the ones in upa
+        # (dictionary (user, set of permissions)), e.g., the dataset the solution has been mined from
+        if self.sparse_checks:
+            return differing_users(self.grants(), grants(upa))
+        ua = self.get_ua()
+        pa = self.get_pa()
+        dupa = self.get_dupa()
+        wrong = set()
+        for u in upa.keys() | ua.keys() | dupa.keys():
+            perms = set(dupa.get(u, ()))
+            for r in ua.get(u, ()):
+                perms.update(pa[r])
+            if perms != upa.get(u, set()):
+                wrong.add(u)
+        return wrong
+
+    def check(self, upa):
+        # whether the solution grants exactly the permissions in upa (dictionary or dataset
+        # loaded by Mining) to every user
+        if isinstance(upa, Mining):  # the original UPA, kept aside if users have been collapsed
+            upa = getattr(upa, '_upa_bk', upa._upa)
+        return not self.wrong_users(upa)
+
+
+class SupersetIndex:
+    # Inverted index answering superset queries, i.e., given a set of keys (e.g., permissions)
+    # it returns the items (e.g., users) occurring in the posting lists of all keys.
+    # Posting lists are intersected starting from the shortest ones. The postings dictionary
+    # (key, set of items) or (key, bitmask of items) is shared, so the index reflects any
+    # update made to it (e.g., by _update_unc)
+    def __init__(self, postings, bitset=False):
+        self._postings = postings
+        self._bitset = bitset
+
+    def query(self, keys):
+        lists = list()
+        for k in keys:
+            if k not in self._postings:
+                return set()
+            lists.append(self._postings[k])
+        lists.sort(key=int.bit_count if self._bitset else len)  # rarest keys first
+
+        result = lists[0]
+        for items in lists[1:]:
+            if not result:
+                break
+            result = result & items
+        return from_bits(result) if self._bitset else set(result)
+
+
+class LazyHeap:
+    # Priority queue selecting the row (e.g., user) of minimum (criterion='min') or maximum
+    # (criterion='max') weight. Ties are broken by rank, i.e., the position of the row in the
+    # sequence the heuristic used to scan, so that the selected row is the one min/max would
+    # return. Changes of weight (or rank) push a new entry; stale entries are discarded when
+    # they surface
+    def __init__(self, rows, weight, rank, criterion='min'):
+        self._weight = weight  # function (row) -> current weight of row
+        self._rank = rank      # dictionary (row, position)
+        self._sign = 1 if criterion == 'min' else -1
+        self._current = {r: (self._sign * weight(r), rank[r]) for r in rows}
+        self._heap = [(k, i, r) for r, (k, i) in self._current.items()]
+        heapq.heapify(self._heap)
+
+    def update(self, row):
+        key = (self._sign * self._weight(row), self._rank[row])
+        if self._current.get(row) != key:
+            self._current[row] = key
+            heapq.heappush(self._heap, (key[0], key[1], row))
+
+    def remove(self, row):
+        self._current.pop(row, None)
+
+    def top(self):
+        while self._heap:
+            key, i, row = self._heap[0]
+            if self._current.get(row) == (key, i):
+                return row
+            heapq.heappop(self._heap)
+        return None
+
+    def copy(self):
+        heap = LazyHeap.__new__(LazyHeap)
+        heap._weight = self._weight
+        heap._rank = self._rank
+        heap._sign = self._sign
+        heap._current = dict(self._current)
+        heap._heap = list(self._heap)
+        return heap
+
+
+class RoleRegistry:
+    # Interns roles by their set of permissions, so that looking for a role with a given set
+    # of permissions takes O(1) instead of a scan of PA. It also keeps, for each role, the
+    # number of users assigned to it and which sets of permissions are forbidden (i.e., they
+    # correspond to roles that cannot be assigned to further users)
+    def __init__(self):
+        self._roles = dict()        # key: frozenset of permissions - value: list of roles having them
+        self._prms = dict()         # key: role - value: frozenset of its permissions
+        self._forbidden = set()     # frozensets of forbidden permissions
+        self.au = dict()            # key: role - value: number of users assigned to key
+
+    def __contains__(self, prms):
+        return frozenset(prms) in self._roles
+
+    def __len__(self):  # number of distinct roles
+        return len(self._roles)
+
+    def find(self, prms):
+        # first registered role having exactly the permissions in prms, if any
+        roles = self._roles.get(frozenset(prms))
+        return roles[0] if roles else None
+
+    def add(self, role, prms, users=0):
+        key = frozenset(prms)
+        self._prms[role] = key
+        if key in self._roles:
+            self._roles[key].append(role)
+        else:
+            self._roles[key] = [role]
+        self.au[role] = users
+
+    def remove(self, role):
+        key = self._prms.pop(role)
+        self._roles[key].remove(role)
+        if not self._roles[key]:
+            del self._roles[key]
+        del self.au[role]
+
+    def assign(self, role, users=1):
+        self.au[role] += users
+
+    def forbid(self, prms):
+        self._forbidden.add(frozenset(prms))
+
+    def allow(self, prms):
+        self._forbidden.discard(frozenset(prms))
+
+    def is_forbidden(self, prms):
+        return frozenset(prms) in self._forbidden
+
+    def copy(self):
+        registry = RoleRegistry()
+        registry._roles = {key: list(roles) for key, roles in self._roles.items()}
+        registry._prms = dict(self._prms)
+        registry._forbidden = set(self._forbidden)
+        registry.au = dict(self.au)
+        return registry
+
+
+class Stats:
+    # Opt-in instrumentation of a run (see Mining.instrument and POST.instrument): the phases of
+    # the state (methods listed in its _phases, with the counter each call increments, if any)
+    # are wrapped on the instance only, so that runs that are not instrumented pay nothing.
+    # Further counters (listed in _counters) are incremented by the state through count.
+    # Timers are cumulative and inclusive (e.g., _pick_role includes the superset queries it
+    # makes). progress, if any, is called as progress(uncovered users, WSC) once every `every`
+    # calls of the phase the state iterates on (_progress_phase), before the call, and when mine
+    # returns, or after each phase if the state does not iterate
+    def __init__(self, state, progress=None, every=1):
+        self.timers = dict()    # key: phase - value: seconds spent in it
+        self.counters = dict()  # key: counter - value: count
+        self._state = state
+        self._progress = progress
+        self._every = every
+        self._calls = 0  # calls of the phase the state iterates on
+        for phase, counter in state._phases.items():
+            self.timers[phase] = 0.0
+            if counter is not None:
+                self.counters[counter] = 0
+            setattr(state, phase, self._timed(phase, counter, getattr(state, phase)))
+        for counter in state._counters:
+            self.counters[counter] = 0
+
+    def _timed(self, phase, counter, method):
+        iterates = phase == self._state._progress_phase
+        reports = self._state._progress_phase is None or phase == 'mine'
+
+        def timed(*args, **kwargs):
+            if iterates and self._progress is not None:
+                if self._calls % self._every == 0:
+                    self.report()
+                self._calls += 1
+            start = time.perf_counter()
+            result = method(*args, **kwargs)
+            self.timers[phase] += time.perf_counter() - start
+            if counter is not None:
+                self.counters[counter] += 1
+            if reports and self._progress is not None:
+                self.report()
+            return result
+        return timed
+
+    def report(self):
+        # call progress on the current state
+        self._progress(len(getattr(self._state, '_unc_users', ())), self._state.get_wsc()[0])
+
+    def count(self, counter, n=1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def summary(self):
+        # dictionary summarizing the run, see dump
+        state = self._state
+        wsc, nr, ua, pa = state.get_wsc()
+        counters = dict(self.counters)
+        if 'roles_created' not in counters and hasattr(state, '_k'):
+            counters['roles_created'] = state._k  # mined roles are numbered from 1
+        return {'heuristic': type(state).__name__,
+                'dataset': getattr(state, '_dataset', getattr(state, '_state', None)),
+                'mur': getattr(state, '_mur', None),
+                'wsc': wsc, 'roles': nr, 'ua': ua, 'pa': pa,
+                'timers': self.timers,
+                'counters': counters}
+
+    def dump(self, path):
+        # write the summary of the run to path, as JSON
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
 
 class POST:
+    _stats = None  # see instrument
+    _phases = dict()  # key: method timed by Stats - value: counter incremented by its calls, if any
+    _counters = ()    # counters incremented by the methods (see Stats.count)
+    _progress_phase = None
+    cache_states = True  # compile RBAC states to binary caches (see compile_decomposition) and load from them
+    sparse_checks = sparse is not None  # verify solutions through sparse matrices (see grants), if SciPy is available
+
     def __init__(self, state):
         self._upa = {}  # dictionary (user, set of permissions)
         self._permissions = set()
@@ -9,53 +721,92 @@ class POST:
         self._ua = dict()         # post-processed ua
         self._pa = dict()         # post-processed pa
         self._nr = 0              # number of roles
-        self._state = state       # starting RBAC state (file containing a representation of UA and PA)
-        self._load_ua_pa()
+        self._registry = RoleRegistry()  # roles in the post-processed pa
+        self._ua_size = 0         # |ua| and |pa|, kept up to date as ua and pa change (see get_wsc)
+        self._pa_size = 0
+        if isinstance(state, POST):  # share the (never modified) starting state loaded by state
+            self._state = state._state
+            self._orig_ua = state._orig_ua
+            self._orig_pa = state._orig_pa
+            self._upa = state._upa
+        elif isinstance(state, SharedArrays):  # see publish
+            self._state = state.source
+            self._load_ua_pa_arrays(*state.arrays)
+        elif isinstance(state, Solution):  # e.g., mined by a heuristic (DUPA is left out)
+            self._state = state.source
+            self._load_ua_pa_arrays(*state.decomposition())
+        else:
+            self._state = state   # starting RBAC state (file containing a representation of UA and PA)
+            self._load_ua_pa()
         self._users = set(self._orig_ua.keys())
-        self._original_users = deepcopy(self._users)
+        self._original_users = set(list(self._users))  # same as deepcopy, without its overhead
+
+    @staticmethod
+    def publish(state):
+        # publish the RBAC state in the file state to shared memory, for POST instances built by
+        # other processes without parsing the file (each one still copies the state, see
+        # SharedArrays). The caller unlinks the returned block when done
+        return SharedArrays.publish(load_arrays(state, compile_decomposition), state)
+
+    def instrument(self, progress=None, every=1):
+        # time and count the phases of the following runs (see Stats), returning the Stats collecting them
+        self._stats = Stats(self, progress, every)
+        return self._stats
+
+    def clone(self, *args, **kwargs):
+        # new instance of the same class on the starting state loaded by self, without reading
+        # it again; args are the ones the constructor takes after the state
+        return type(self)(self, *args, **kwargs)
+
+    def solution(self):
+        # post-processed ua and pa as a Solution
+        return Solution.from_dicts(self._ua, self._pa, source=self._state)
 
     def _load_ua_pa(self):
-        f = open(self._state, 'r')
-        for line in f:
-            if 'role' in line:
-                r = int(line.split(':')[1])
-                # print('role: ', r)
-            elif 'permissions' in line:
-                permissions = line.split(':')[1]
-                permissions = set(map(int, permissions.split(',')))
-                self._orig_pa[r] = permissions
-                # print('permissions: ', pa[r])
-            elif 'users' in line:
-                users = line.split(':')[1]
-                users = set(map(int, users.split(',')))
-                # print('users: ', users)
-
-                for u in users:
-                    if u in self._orig_ua.keys():
-                        self._orig_ua[u].add(r)
-                    else:
-                        self._orig_ua[u] = {r}
+        if self.cache_states:
+            self._load_ua_pa_arrays(*load_arrays(self._state, compile_decomposition))
+        else:
+            self._load_ua_pa_arrays(*compile_decomposition(self._state))
 
-                    if u in self._upa:
-                        self._upa[u].update(permissions)
-                    else:
-                        self._upa[u] = deepcopy(permissions)
-        f.close()
+    def _load_ua_pa_arrays(self, roles, pa_offsets, pa, ua_offsets, ua):
+        # rows of UA and PA are laid out as deepcopy would copy them, since they are shared by
+        # the post-processed ua and pa (see POST_UDCC), whose iteration order breaks ties
+        user_prms = dict()  # key: user - value: permission sets of the roles assigned to key
+        for i, r in enumerate(roles):
+            permissions = set(list(set(pa[pa_offsets[i]:pa_offsets[i + 1]])))
+            self._orig_pa[r] = permissions
+            for u in set(ua[ua_offsets[i]:ua_offsets[i + 1]]):
+                if u in self._orig_ua:
+                    self._orig_ua[u].add(r)
+                    user_prms[u].append(permissions)
+                else:
+                    self._orig_ua[u] = {r}
+                    user_prms[u] = [permissions]
+
+        for u in self._orig_ua:
+            self._orig_ua[u] = set(list(self._orig_ua[u]))
+
+        # users with a single role share its permission set (_upa is never modified)
+        for u, prms in user_prms.items():
+            self._upa[u] = prms[0] if len(prms) == 1 else set().union(*prms)
 
     def _update_ua_pa(self, usrs, role):
 
-        if role not in self._pa.values():
+        found = self._registry.find(role)
+        if found is None:
             self._nr += 1
             self._pa[self._nr] = role
+            self._pa_size += len(role)
             found = self._nr
-        else:
-            found = [r for (r, prms) in self._pa.items() if prms == role][0]
+            self._registry.add(found, role)
 
         for u in usrs:
-            if u in self._ua:
+            if u not in self._ua:
+                self._ua[u] = set()
+            if found not in self._ua[u]:
                 self._ua[u].add(found)
-            else:
-                self._ua[u] = {found}
+                self._ua_size += 1
+                self._registry.assign(found)
 
     def _cs(self):
         if len(self._ua) != len(self._original_users):
@@ -63,6 +814,14 @@ class POST:
             return False
 
         flag = True
+        if self.sparse_checks:
+            wrong = differing_users(grants(self._ua, self._pa), grants(self._upa))
+            for u in self._ua:
+                if u in wrong:
+                    flag = False, u
+                    break
+            return flag
+
         for u in self._ua:
             perms = set()
             for r in self._ua[u]:
@@ -82,6 +841,9 @@ class POST:
         if set(self._ua.keys()) != set(self._orig_ua.keys()):
             return False
 
+        if self.sparse_checks:
+            return not differing_users(grants(self._orig_ua, self._orig_pa), grants(self._ua, self._pa))
+
         for u in self._ua.keys():
             s1 = set()
             s2 = set()
@@ -110,36 +872,466 @@ class POST:
         return True
 
     def get_wsc(self):
-        nroles = len(self._pa.keys())
-        ua_size = 0
-        for roles in self._ua.values():
-            ua_size += len(roles)
-        pa_size = 0
-        for prms in self._pa.values():
-            pa_size += len(prms)
-        return nroles + ua_size + pa_size, nroles, ua_size, pa_size
+        nroles = len(self._pa)
+        return nroles + self._ua_size + self._pa_size, nroles, self._ua_size, self._pa_size
+
+def mine_component(heuristic, upa, args, kwargs):
+    # mine the UPA of a connected component (see Mining.components) by heuristic, returning the
+    # (expanded) UA and PA, and DUPA if the heuristic has one
+    state = heuristic(upa, *args, **kwargs)
+    state.mine()
+    state.expand_solution()
+    return state._ua, state._pa, getattr(state, '_dupa', None)
+
 
 class Mining:
-    def __init__(self, dataset, unique = False):
-        if type(dataset) != str and type(dataset) != dict:
+    _stats = None  # see instrument
+    _phases = {'mine': None,
+               '_pick_role': 'iterations',
+               '_update_ua_pa': None,
+               '_update_unc': None,
+               '_superset_users': 'superset_queries',
+               '_superset_permissions': 'superset_queries'}
+    _counters = ()
+    _progress_phase = '_pick_role'
+    _checkpoint = None  # see checkpoints
+    _shares_base = False  # whether users and permissions are the ones of a base (see from_base)
+    # scalar attributes (see _scalars) depending on how the dataset has been handed to the constructor
+    # or on time, which resume does not compare
+    _transient = ('_dataset', '_shares_base', '_checkpoint_time')
+    cache_datasets = True  # compile datasets to binary caches (see compile_upa) and load from them
+    sparse_checks = sparse is not None  # verify solutions through sparse matrices (see grants), if SciPy is available
+
+    def __init__(self, dataset, unique = False, weighted = False):
+        if type(dataset) != str and type(dataset) != dict and not isinstance(dataset, (Mining, SharedArrays)):
             raise Exception('Dataset error: wrong format')
 
-        self._users = set()
-        self._permissions = set()
-        self._upa = {}  # dictionary (user, set of permissions)
         self._upa_unique = {}  # dictionary (user, set of permissions) only users with distinct set of permissions
-        self._pua = {}  # dictionary (permission, set of users)
         self._ua = {}   # dictionary (user, set of roles)
         self._pa = {}   # dictionary (role, set of permissions)
         self._k = 0     # mined roles so far
+        self._registry = RoleRegistry()  # mined roles, indexed by their set of permissions
+        self._ua_size = 0  # |UA| and |PA|, kept up to date as roles are mined (see get_wsc)
+        self._pa_size = 0
+
+        if isinstance(dataset, Mining):  # share the dataset loaded by load_base
+            self._dataset = dataset._dataset
+            self._users = dataset._users
+            self._permissions = dataset._permissions
+            self._shares_base = True
+            self._upa = dict(dataset._upa)  # rows are shared with the base, and never modified (see below)
+            self._pua = dict(dataset._pua)
+            self._n = dataset._n
+        else:
+            self._load(dataset)
+
+        self._unique = unique
+        self._weighted = weighted
+        self._expanded = False
+        if unique or weighted:  # collapse users having the same set of permissions to just one user
+            self._unique_users()
+
+        # the uncovered entries start out sharing the rows of UPA/PUA: _update_unc replaces a
+        # row (rather than modifying it) the first time it covers some of its entries, so the
+        # original rows stay untouched and only the covered rows get their own copy
+        self._unc_upa = dict(self._upa)
+        self._unc_pua = dict(self._pua)
+        self._unc_users = set(list(self._users))  # same as deepcopy, without its overhead
+        self._unc_permissions = set(list(self._permissions))
+
+        # superset queries over UPA (users holding given permissions), over the uncovered
+        # entries of UPA, and over PUA (permissions granted to given users)
+        self._users_index = SupersetIndex(self._pua)
+        self._unc_users_index = SupersetIndex(self._unc_pua)
+        self._permissions_index = SupersetIndex(self._upa)
+        # _unc_users only shrinks, so the relative order of its elements never changes
+        self._unc_rank = {u: i for i, u in enumerate(self._unc_users)}
+        self._upa_rank = {u: i for i, u in enumerate(self._unc_upa)}
+        if weighted:
+            self._init_groups()
+
+        # heaps of uncovered users/permissions, set up by heuristics selecting rows by weight
+        self._user_heap = None
+        self._permission_heap = None
+        self._truncated = False  # whether some users have been left out because of a limit (e.g., mur)
+
+    def _snapshot(self):
+        # copy of the state modified by mining (see _restore)
+        snapshot = {'k': self._k,
+                    'ua_size': self._ua_size,
+                    'pa_size': self._pa_size,
+                    'ua': {u: set(roles) for u, roles in self._ua.items()},
+                    'pa': dict(self._pa),
+                    'registry': self._registry.copy(),
+                    'unc_upa': dict(self._unc_upa),
+                    'unc_pua': dict(self._unc_pua),
+                    'unc_users': set(self._unc_users),
+                    'unc_permissions': set(self._unc_permissions),
+                    'user_heap': self._user_heap.copy() if self._user_heap else None,
+                    'permission_heap': self._permission_heap.copy() if self._permission_heap else None}
+        return snapshot
+
+    def _restore(self, snapshot):
+        # bring the state back to snapshot (taken by _snapshot), whose structures are used as they are
+        self._k = snapshot['k']
+        self._ua_size = snapshot['ua_size']
+        self._pa_size = snapshot['pa_size']
+        self._ua = snapshot['ua']
+        self._pa = snapshot['pa']
+        self._registry = snapshot['registry']
+        self._unc_upa = snapshot['unc_upa']
+        self._unc_pua = snapshot['unc_pua']
+        self._unc_users = snapshot['unc_users']
+        self._unc_permissions = snapshot['unc_permissions']
+        self._user_heap = snapshot['user_heap']
+        self._permission_heap = snapshot['permission_heap']
+        self._unc_users_index = SupersetIndex(self._unc_pua)
+
+    @staticmethod
+    def load_base(dataset):
+        # load dataset (file name, dictionary representing UPA or SharedArrays) just once, for the instances
+        # built by from_base: they all share it, and none of them modifies it
+        base = Mining.__new__(Mining)
+        base._load(dataset)
+        return base
+
+    @staticmethod
+    def publish(dataset):
+        # publish the dataset in the file dataset to shared memory: Mining instances (or bases) in
+        # any process can be built from the returned block without parsing the file, each one
+        # copying UPA/PUA into its own rows (see SharedArrays). The caller unlinks the block when done
+        return SharedArrays.publish(load_arrays(dataset, compile_upa), dataset)
+
+    @classmethod
+    def from_base(cls, base, *args, **kwargs):
+        # new instance of the heuristic on the dataset loaded by load_base, e.g.
+        # UDCC_1.from_base(base, mur); args are the ones the constructor takes after the dataset
+        return cls(base, *args, **kwargs)
+
+    def instrument(self, progress=None, every=1):
+        # time and count the phases of the following runs (see Stats), returning the Stats collecting them
+        self._stats = Stats(self, progress, every)
+        return self._stats
+
+    def checkpoints(self, path, every=None, seconds=None):
+        # make mine write a checkpoint to path every `every` iterations and/or every `seconds` seconds,
+        # so that an interrupted run can be continued by resume. To be called before mine: rather than
+        # the working state, checkpoints hold the choices made at each iteration (see _step), and the
+        # batches applied by update, appended to path as they are made. Writing checkpoints leaves the
+        # run as it is: it mines the same solution as without them
+        self._checkpoint = {'path': path, 'every': every, 'seconds': seconds, 'iteration': 0, 'trace': list()}
+        self._write_checkpoint('wb', heuristic=type(self).__name__, digest=self._upa_digest(),
+                               every=every, seconds=seconds)
+
+    def resume(self, path):
+        # continue, on this new instance, the run whose checkpoints are in path (see checkpoints): the
+        # instance has to be built as the interrupted one was, i.e., same heuristic, dataset and
+        # parameters. The iterations recorded in path are applied again, without making the choices
+        # again, so that every set is rebuilt the way the interrupted run built it. Then the run goes
+        # on from the last checkpoint, writing further ones to path, and mines the same solution as a
+        # run that has not been interrupted
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:len(CHECKPOINT_MAGIC)] != CHECKPOINT_MAGIC:
+            raise Exception('Checkpoint error: wrong format')
+        chunks = list()
+        offset = len(CHECKPOINT_MAGIC)
+        while offset + 8 <= len(data):
+            (size,) = struct.unpack_from('<Q', data, offset)
+            if offset + 8 + size > len(data):  # cut short by the interruption, the previous one holds
+                break
+            chunks.append(pickle.loads(zlib.decompress(data[offset + 8:offset + 8 + size])))
+            offset += 8 + size
+        if not chunks:
+            raise Exception('Checkpoint error: wrong format')
+        header = chunks[0]
+        if header['heuristic'] != type(self).__name__:
+            raise Exception('Checkpoint error: written by ' + header['heuristic'])
+        if header['digest'] != self._upa_digest() or header['scalars'] != self._scalars():
+            raise Exception('Checkpoint error: the run did not start from this state')
+
+        for chunk in chunks:
+            for kind, args in chunk['trace']:
+                if kind == 'update':
+                    self._change(*args)
+                else:
+                    self._step(*args)
+        last = chunks[-1]
+        if self.get_wsc() != last['wsc']:
+            raise Exception('Checkpoint error: the iterations cannot be applied again')
+        self.__dict__.update(last['scalars'])  # e.g., flags set while making the choices
+        random.setstate(last['random'])
+
+        with open(path, 'r+b') as f:  # further checkpoints follow the last complete one
+            f.truncate(offset)
+        self._checkpoint = {'path': path, 'every': header['every'], 'seconds': header['seconds'],
+                            'iteration': last['iteration'], 'trace': list()}
+        self._checkpoint_time = time.monotonic()
+        self.mine()
+
+    def solution(self):
+        # mined UA, PA and DUPA (if the heuristic has one) as a Solution, e.g., to be handed to
+        # POST_UDCC or checked against the dataset. The solution is expanded first (see expand_solution)
+        self.expand_solution()
+        return Solution.from_dicts(self._ua, self._pa, getattr(self, '_dupa', None), self._dataset)
+
+    def _tick(self, *choices):
+        # called by mine after each iteration, when checkpoints are on: record the choices of the
+        # iteration (the arguments of _step, which keeps them) and write a checkpoint if due
+        c = self._checkpoint
+        c['trace'].append(('step', choices))
+        c['iteration'] += 1
+        if (c['every'] and c['iteration'] % c['every'] == 0) or \
+                (c['seconds'] is not None and time.monotonic() - self._checkpoint_time >= c['seconds']):
+            self._write_checkpoint()
+
+    def _write_checkpoint(self, mode='ab', **header):
+        # append to the checkpoints the choices recorded since the last one, along with the state of
+        # random and the scalar attributes (e.g., counters and flags), compressed and preceded by
+        # their size. The first checkpoint (mode='wb') also holds header, which resume checks
+        c = self._checkpoint
+        chunk = dict(header, trace=c['trace'], iteration=c['iteration'], random=random.getstate(),
+                     scalars=self._scalars(), wsc=self.get_wsc())
+        data = zlib.compress(pickle.dumps(chunk, pickle.HIGHEST_PROTOCOL), 1)
+        with open(c['path'], mode) as f:
+            if mode == 'wb':
+                f.write(CHECKPOINT_MAGIC)
+            f.write(struct.pack('<Q', len(data)) + data)
+        c['trace'] = list()
+        self._checkpoint_time = time.monotonic()
+
+    def _scalars(self):
+        # attributes holding numbers, flags or strings, e.g., mur and counters (see _transient)
+        return {k: v for k, v in self.__dict__.items()
+                if isinstance(v, (bool, int, float, str)) and k not in self._transient}
+
+    def _upa_digest(self):
+        # digest of UPA and PUA as loaded, rows listed in their iteration order (which breaks ties)
+        upa, pua = (self._upa_bk, self._pua_bk) if self._unique or self._weighted else (self._upa, self._pua)
+        return hashlib.sha1(repr((list(upa.items()), list(pua.items()))).encode()).digest()
+
+    def components(self):
+        # connected components of the bipartite graph UPA, found by union-find over the users of
+        # each permission: roles never span two components, which can be mined independently.
+        # Returns the UPA (dictionary (user, set of permissions)) of each component, users and
+        # components listed according to the order of UPA
+        upa = self._upa_bk if self._unique or self._weighted else self._upa
+        pua = self._pua_bk if self._unique or self._weighted else self._pua
+        parent = {u: u for u in upa}
+
+        def find(u):
+            while parent[u] != u:
+                parent[u] = parent[parent[u]]  # path halving
+                u = parent[u]
+            return u
+
+        for usrs in pua.values():
+            usrs = iter(usrs)
+            root = find(next(usrs))
+            for u in usrs:
+                r = find(u)
+                if r != root:
+                    parent[r] = root
+
+        components = dict()  # key: root - value: UPA of the component
+        for u, prms in upa.items():
+            r = find(u)
+            if r in components:
+                components[r][u] = prms
+            else:
+                components[r] = {u: prms}
+        return list(components.values())
+
+    @classmethod
+    def mine_components(cls, dataset, *args, workers=None, **kwargs):
+        # mine dataset component by component (see components), each one by a new instance of the
+        # heuristic run by a pool of workers processes (default: one per core), and merge the
+        # solutions, renumbering roles. Args are the ones the constructor takes after the dataset;
+        # mur only bounds the users of a role, so it holds component by component. Returns an
+        # instance of the heuristic on dataset holding the merged (expanded) solution. Results may
+        # differ from the ones of mine when ties are broken across components (e.g., UDCC_2)
+        state = cls(dataset, *args, **kwargs)
+        parts = state.components()
+        if len(parts) == 1:  # nothing to shard
+            state.mine()
+            state.expand_solution()
+            return state
+        if workers is None:
+            workers = os.cpu_count() or 1
+        solutions = list()
+        if workers > 1:
+            n = len(parts)
+            with ProcessPoolExecutor(min(workers, n)) as executor:
+                solutions = list(executor.map(mine_component, [cls] * n, parts, [args] * n, [kwargs] * n,
+                                              chunksize=max(1, n // (4 * workers))))
+        else:
+            for upa in parts:
+                solutions.append(mine_component(cls, upa, args, kwargs))
+        state._merge(solutions)
+        return state
+
+    def _merge(self, solutions):
+        # set the solution to the union of solutions (UA, PA and DUPA of disjoint components, see
+        # mine_components), roles of each component being renumbered after the ones of the previous.
+        # DUPA, if any, is merged by the heuristics having it
+        if self._unique or self._weighted:  # the merged solution is the expanded one
+            self._users = self._users_bk
+            self._upa = self._upa_bk
+            self._pua = self._pua_bk
+            self._expanded = True
+        self._ua = dict()
+        self._pa = dict()
+        self._registry = RoleRegistry()
+        for ua, pa, dupa in solutions:
+            ids = dict()  # key: role of the component - value: role of the merged solution
+            for r, prms in pa.items():
+                self._k += 1
+                ids[r] = self._k
+                self._pa[self._k] = prms
+                self._registry.add(self._k, prms)
+            for u, roles in ua.items():
+                self._ua[u] = {ids[r] for r in roles}
+                for r in self._ua[u]:
+                    self._registry.assign(r)
+        self._ua_size = sum(map(len, self._ua.values()))
+        self._pa_size = sum(map(len, self._pa.values()))
+        # nothing is left uncovered: the dictionaries are emptied in place, as indexes share them
+        self._unc_upa.clear()
+        self._unc_pua.clear()
+        self._unc_users = set()
+        self._unc_permissions = set()
+
+    def update(self, added=(), removed=()):
+        # apply a batch of changes of UPA, i.e., (user, permission) pairs added and removed (the
+        # latter first), to the mined state and repair the solution of the affected users only:
+        # roles granting them removed permissions are taken away (and dropped once no user has
+        # them), then mine covers the permissions they are left without, as the heuristic covers
+        # the dataset (e.g., at most mur users per role). Cost depends on the size of the changes
+        # rather than on the dataset. Returns the updated UA, PA and DUPA (if the heuristic has one)
+        added = list(added)
+        removed = list(removed)
+        self._change(added, removed)
+        if self._checkpoint is not None:  # applied again by resume, before the following iterations
+            self._checkpoint['trace'].append(('update', (added, removed)))
+            self._write_checkpoint()
+        self.mine()
+        return self._ua, self._pa, getattr(self, '_dupa', None)
+
+    def _change(self, added, removed):
+        # apply the changes of UPA (see update), leaving the affected users uncovered
+        if self._unique or self._weighted:
+            raise Exception('Update error: not available when users are collapsed')
+        if self._unc_users:
+            raise Exception('Update error: the state has not been mined')
+        if self._shares_base:  # from now on, users and permissions change
+            self._users = set(self._users)
+            self._permissions = set(self._permissions)
+            self._shares_base = False
+
+        changes = dict()  # key: user - value: (permissions removed, permissions added)
+        for i, pairs in enumerate((removed, added)):
+            for u, p in pairs:
+                if u not in changes:
+                    changes[u] = (set(), set())
+                changes[u][i].add(p)
+                changes[u][1 - i].discard(p)
+
+        column_changes = dict()  # key: permission - value: (users removed, users added)
+        for u, (r_prms, a_prms) in changes.items():
+            prms = self._upa.get(u, set())
+            r_prms &= prms
+            a_prms -= prms
+            if not (r_prms or a_prms):
+                continue
+            if u not in self._upa:  # new user
+                self._users.add(u)
+                self._unc_rank[u] = len(self._unc_rank)
+                self._upa_rank[u] = len(self._upa_rank)
+            self._upa[u] = (prms - r_prms) | a_prms  # rows are replaced, as they may be shared
+            self._n += len(a_prms) - len(r_prms)
+            for i, ps in enumerate((r_prms, a_prms)):
+                for p in ps:
+                    if p not in column_changes:
+                        column_changes[p] = (set(), set())
+                    column_changes[p][i].add(u)
+
+        for p, (r_usrs, a_usrs) in column_changes.items():
+            usrs = (self._pua.get(p, set()) - r_usrs) | a_usrs
+            if usrs:
+                self._pua[p] = usrs
+                self._permissions.add(p)
+            else:  # permission no longer granted
+                del self._pua[p]
+                self._permissions.discard(p)
+                self._unc_pua.pop(p, None)
+
+        # affected users get back in the uncovered structures, with the permissions left uncovered
+        unc_pua = dict()
+        for u in {u for usrs in column_changes.values() for u in chain.from_iterable(usrs)}:
+            if not self._upa[u]:  # user no longer having permissions
+                del self._upa[u]
+                self._users.discard(u)
+            uncovered = self._repair(u)
+            if uncovered:
+                self._unc_upa[u] = uncovered
+                self._unc_users.add(u)
+                for p in uncovered:
+                    if p in unc_pua:
+                        unc_pua[p].add(u)
+                    else:
+                        unc_pua[p] = {u}
+            else:
+                self._unc_upa.pop(u, None)
+        for p, usrs in unc_pua.items():
+            self._unc_pua[p] = usrs
+            self._unc_permissions.add(p)
+
+        self._user_heap = None
+        self._permission_heap = None
+        self._init_heaps()
+
+    def _repair(self, u):
+        # take the roles granting permissions u does not have away from u (see update), returning
+        # the permissions of u left uncovered
+        prms = self._upa.get(u, set())
+        for r in [r for r in self._ua.get(u, ()) if not self._pa[r] <= prms]:
+            self._unassign(u, r)
+        covered = set()
+        for r in self._ua.get(u, ()):
+            covered.update(self._pa[r])
+        return prms - covered
+
+    def _unassign(self, u, r):
+        self._ua[u].remove(r)
+        if not self._ua[u]:
+            del self._ua[u]
+        self._ua_size -= 1
+        self._registry.assign(r, -1)
+        self._registry.allow(self._pa[r])  # the role can be assigned to further users, if it is kept
+        if self._registry.au[r] == 0:
+            self._remove_role(r)
+
+    def _remove_role(self, r):
+        self._pa_size -= len(self._pa[r])
+        del self._pa[r]
+        self._registry.remove(r)
+
+    def _load(self, dataset):
+        self._users = set()
+        self._permissions = set()
+        self._upa = {}  # dictionary (user, set of permissions)
+        self._pua = {}  # dictionary (permission, set of users)
         self._n = 0     # total number of granted access to resources (i.e., number of pairs in dataset)
 
         if type(dataset) == str:
             self._dataset = dataset
             self._load_upa()
+        elif isinstance(dataset, SharedArrays):  # see publish
+            self._dataset = dataset.source
+            self._load_upa_arrays(*dataset.arrays)
         else: # the dataset is represented by a dictionary (UPA)
             self._dataset = '-- direct upa inizialization --'
-            self._upa = dataset
+            self._upa = dict(dataset)  # rows are rebuilt below, leave the caller's dictionary as it is
             self._users = set(self._upa.keys())
             for u, prms in self._upa.items():
                 self._permissions = self._permissions.union(prms)
@@ -150,15 +1342,30 @@ class Mining:
                     else:
                         self._pua[p] = {u}
 
-        if unique:  # collapse users having the same set of permissions to just one user
-            self._unique_users()
-
-        self._unc_upa = deepcopy(self._upa)
-        self._unc_pua = deepcopy(self._pua)
-        self._unc_users = deepcopy(self._users)
-        self._unc_permissions = deepcopy(self._permissions)
+        # rows are rebuilt in place as they would be laid out by deepcopy, since the heuristics
+        # break ties according to their iteration order. This happens once per dataset: instances
+        # built by from_base share the rows of the base
+        for matrix in (self._upa, self._pua):
+            for k in matrix:
+                matrix[k] = set(list(matrix[k]))
 
     def _load_upa(self):
+        if not self.cache_datasets:
+            self._parse_upa()
+        else:
+            self._load_upa_arrays(*load_arrays(self._dataset, compile_upa))
+
+    def _load_upa_arrays(self, users, u_offsets, u_prms, prms, p_offsets, p_users):
+        # users and permissions are added in the same order _parse_upa would add them
+        for i, u in enumerate(users):
+            self._upa[u] = set(u_prms[u_offsets[i]:u_offsets[i + 1]])
+        for i, p in enumerate(prms):
+            self._pua[p] = set(p_users[p_offsets[i]:p_offsets[i + 1]])
+        self._users = set(users)
+        self._permissions = set(prms)
+        self._n = len(u_prms)
+
+    def _parse_upa(self):
         with open(self._dataset) as f:
             for u_p in f:
                 (user, permission) = u_p.split()
@@ -185,48 +1392,180 @@ class Mining:
         return self._pa
 
     def _unique_users(self):
-        self._users_bk = deepcopy(self._users)  # users backup
-        self._upa_bk = deepcopy(self._upa)      # upa backup
-        self._users_map = dict()                #key = user, value=list of users with identical permissions
-        equal_prms = dict()
+        self._users_bk = self._users  # users backup
+        self._upa_bk = self._upa      # upa backup
+        self._pua_bk = self._pua      # pua backup
+        self._users_map = dict()      #key = user, value=list of users with identical permissions
+
+        # group users by their (frozen) set of permissions, each group is represented by its lowest user
+        groups = dict()
         for u in self._users:
-            equal_prms[u] = u
-        self._upa = dict()
+            prms = frozenset(self._upa_bk[u])
+            if prms in groups:
+                groups[prms].append(u)
+            else:
+                groups[prms] = [u]
+        for usrs in groups.values():
+            self._users_map[min(usrs)] = usrs
+        self._members = self._users_map
+
+        # reduced user-permission association
+        self._upa = {u: self._upa_bk[u] for u in self._users_map}
+        self._users = set(self._users_map.keys())
+        self._pua = {p: {u for u in usrs if u in self._upa} for p, usrs in self._pua_bk.items()}
+
+    def _init_groups(self):
+        # Weighted mode: each row (group) g stands for the users in _members[g], which share
+        # the same uncovered permissions and the same roles. Groups are split as soon as only
+        # some of their users get a role. Users are ranked as an unweighted run would scan
+        # them, and each group takes the rank of its first user
+        self._member_rank = {u: i for i, u in enumerate(deepcopy(self._users_bk))}
+        self._file_rank = {u: i for i, u in enumerate(self._upa_bk)}
+        self._members = {g: sorted(usrs, key=self._member_rank.__getitem__)
+                         for g, usrs in self._users_map.items()}
+        self._group = {u: g for g, usrs in self._members.items() for u in usrs}
+        for g in self._members:
+            self._rank_group(g)
+        self._next_group = max(self._users_bk) + 1
 
-        for u_i in sorted(self._upa_bk.keys()):
-            for u_j in sorted(self._upa_bk.keys()):
-                if u_j > u_i and equal_prms[u_j] == u_j and self._upa_bk[u_j] == self._upa_bk[u_i]:
-                    equal_prms[u_j] = u_i #u_j's permissions are identical to u_i's ones
+    def _rank_group(self, g):
+        self._unc_rank[g] = self._member_rank[self._members[g][0]]
+        self._upa_rank[g] = min(self._file_rank[u] for u in self._members[g])
 
+    def _multiplicity(self, u):
+        return len(self._members[u]) if self._weighted else 1
 
-        for k, v in equal_prms.items():
-            if v not in self._users_map:
-                self._users_map[v] = [k]
+    def _weight(self, usrs):  # number of users the rows in usrs stand for
+        return sum(len(self._members[u]) for u in usrs) if self._weighted else len(usrs)
+
+    def _representative(self, u):  # the user an unweighted scan would meet first in row u
+        return self._members[u][0] if self._weighted else u
+
+    def _expand_users(self, usrs, key=None, limit=None):
+        # users in the rows usrs (listed in rank order), sorted by key (a function of the row)
+        if not self._weighted:
+            usrs = sorted(usrs, key=key) if key else list(usrs)
+            if limit is not None and len(usrs) > limit:
+                self._truncated = True  # the outcome depends on limit (see UDCC.sweep)
+                return usrs[:limit]
+            return usrs
+        classes = dict()  # key: value of key - value: rows
+        if key is None:
+            classes[0] = usrs
+        else:
+            for g in usrs:
+                k = key(g)
+                if k in classes:
+                    classes[k].append(g)
+                else:
+                    classes[k] = [g]
+        expanded = list()
+        rank = self._member_rank.__getitem__
+        for k in sorted(classes):
+            if limit is None:
+                expanded.extend(sorted(chain.from_iterable(self._members[g] for g in classes[k]), key=rank))
+                continue
+            need = limit - len(expanded)
+            if need == 0:
+                self._truncated = True
+                return expanded
+            # members of a group are kept in rank order and the group is ranked as its first member
+            # (see _rank_group): groups are scanned in rank order until the first need users are known
+            taken = list()
+            for g in sorted(classes[k], key=self._unc_rank.__getitem__):
+                if len(taken) == need and self._unc_rank[g] > rank(taken[-1]):
+                    self._truncated = True
+                    break
+                taken.extend(self._members[g])
+                if len(taken) >= need:
+                    taken.sort(key=rank)
+                    if len(taken) > need:
+                        self._truncated = True  # the outcome depends on limit (see UDCC.sweep)
+                        del taken[need:]
+            taken.sort(key=rank)
+            expanded.extend(taken)
+        return expanded
+
+    def _regroup(self, usrs):
+        # split groups so that the users in usrs are exactly the members of some groups,
+        # and return such groups
+        taken = dict()
+        for u in usrs:
+            g = self._group[u]
+            if g in taken:
+                taken[g].add(u)
             else:
-             self._users_map[v].append(k)
+                taken[g] = {u}
+        groups = set()
+        for g, mbrs in taken.items():
+            groups.add(self._split_group(g, mbrs) if len(mbrs) < len(self._members[g]) else g)
+        return groups
 
-        # reduced user-permission association
-        for u in self._users_map:
-            self._upa[u] = deepcopy(self._upa_bk[u])
+    def _split_group(self, g, mbrs):
+        # move the users mbrs of group g to a new group h, having the same rows and roles as g
+        h = self._next_group
+        self._next_group += 1
+        self._members[h] = [u for u in self._members[g] if u in mbrs]
+        self._members[g] = [u for u in self._members[g] if u not in mbrs]
+        for u in self._members[h]:
+            self._group[u] = h
+        self._rank_group(g)
+        self._rank_group(h)
 
-        self._users = set(self._users_map.keys())
+        self._upa[h] = self._upa[g]
+        self._unc_upa[h] = self._unc_upa[g]
+        self._unc_users.add(h)
+        for p in self._upa[g]:
+            self._pua[p].add(h)
+        for p in self._unc_upa[g]:
+            if self._unc_pua[p] is not self._pua[p]:  # otherwise, already added through the shared row
+                self._unc_pua[p].add(h)
+        if g in self._ua:
+            self._ua[h] = set(self._ua[g])
+            self._ua_size += len(self._ua[h])
+
+        if self._user_heap is not None:
+            self._user_heap.update(g)
+            self._user_heap.update(h)
+        return h
+
+    def expand_solution(self):
+        # when users have been collapsed (unique=True or weighted=True), assign every user the
+        # roles mined for the row representing it and restore the original UPA
+        if not (self._unique or self._weighted) or self._expanded:
+            return self._ua
+        ua = dict()
+        for u, usrs in self._members.items():
+            if u in self._ua:
+                for v in usrs:
+                    ua[v] = set(self._ua[u])
+                if not self._weighted:  # roles have been counted once per representative
+                    for r in self._ua[u]:
+                        self._registry.assign(r, len(usrs) - 1)
+        self._ua = ua
+        self._ua_size = sum(map(len, ua.values()))
+        self._users = self._users_bk
+        self._upa = self._upa_bk
+        self._pua = self._pua_bk
+        self._expanded = True
+        return self._ua
 
     def _update_ua_pa(self, usrs, prms):
-        idx_f = 0
-        for (idx, r) in self._pa.items():
-            if r == prms:
-                idx_f = idx
-                break
-        else:
+        idx_f = self._registry.find(prms)
+        if idx_f is None:
             self._k += 1
             self._pa[self._k] = prms
+            self._pa_size += len(prms)
             idx_f = self._k
+            self._registry.add(idx_f, prms)
 
         for u in usrs:
-            if u in self._ua:
+            if u not in self._ua:
+                self._ua[u] = set()
+            if idx_f not in self._ua[u]:
                 self._ua[u].add(idx_f)
-            else:
-                self._ua[u] = {idx_f}
+                self._ua_size += 1
+                self._registry.assign(idx_f, self._multiplicity(u))
 
     def _update_unc(self, usrs, prms):
         for u in usrs:
@@ -237,18 +1576,63 @@ class Mining:
             self._unc_pua[p] = self._unc_pua[p] - usrs
             if len(self._unc_pua[p]) == 0 and p in self._unc_permissions:
                 self._unc_permissions.remove(p)
+        self._update_heaps(usrs, prms)
+
+    def _update_heaps(self, usrs, prms):
+        if self._user_heap is not None:
+            for u in usrs:
+                if u in self._unc_users:
+                    self._user_heap.update(u)
+                else:
+                    self._user_heap.remove(u)
+        if self._permission_heap is not None:
+            for p in prms:
+                if p in self._unc_permissions:
+                    self._permission_heap.update(p)
+                else:
+                    self._permission_heap.remove(p)
+
+    def _superset_users(self, prms, matrix='unc_upa'):
+        # uncovered users whose row in matrix ('upa' or 'unc_upa') contains all
+        # permissions in prms, listed according to the iteration order of _unc_users
+        if not prms:
+            return sorted(self._unc_users, key=self._unc_rank.__getitem__)
+        if matrix == 'upa':
+            usrs = self._users_index.query(prms)
+            usrs &= self._unc_users
+        else:
+            usrs = self._unc_users_index.query(prms)
+        return sorted(usrs, key=self._unc_rank.__getitem__)
+
+    def _superset_permissions(self, usrs):
+        # uncovered permissions granted (in PUA) to all users in usrs
+        if not usrs:
+            return set(self._unc_permissions)
+        if self._weighted:
+            usrs = {self._group[u] for u in usrs}
+        return self._permissions_index.query(usrs) & self._unc_permissions
 
     def get_wsc(self):
-        nroles = len(self._pa.keys())
-        ua_size = 0
-        for roles in self._ua.values():
-            ua_size += len(roles)
-        pa_size = 0
-        for prms in self._pa.values():
-            pa_size += len(prms)
-        return nroles + ua_size + pa_size, nroles, ua_size, pa_size
+        nroles = len(self._pa)
+        return nroles + self._ua_size + self._pa_size, nroles, self._ua_size, self._pa_size
+
+    def _wrong_users(self, dupa=None):
+        # users whose permissions, as granted by UA and PA (plus dupa, if any), differ from UPA
+        granted = grants(self._ua, self._pa)
+        if dupa:
+            granted = sum(fit(granted, grants(dupa)))
+        return differing_users(granted, grants(self._upa))
 
     def _check_solution(self):
+        if self.sparse_checks:
+            wrong = self._wrong_users()
+            for u in self._users:
+                if u not in self._ua.keys():
+                    return 1, False
+                if u in wrong:
+                    return 2, False
+            return True
+
         for u in self._users:
             if u not in self._ua.keys():
                 return 1, False
@@ -286,10 +1670,7 @@ class Mining:
         print('-- check duplicates --')
         tmp_roles = list(self._pa.values())
         print('    #initial roles', len(tmp_roles))
-        roles = []
-        for r in tmp_roles:
-            if r not in roles:
-                roles.append(r)
+        roles = set(map(frozenset, tmp_roles))
         print('    #final roles', len(roles))
         if len(tmp_roles) == len(roles):
             print('    No duplicated roles')
@@ -310,6 +1691,13 @@ class Mining:
             return False
 
     def get_dupa(self):
+        if self.sparse_checks:  # UPA entries not granted by roles, which cannot grant further permissions
+            granted, upa = fit(grants(self._ua, self._pa), grants(self._upa))
+            if (granted > upa).nnz:
+                print('ERROR!!!')
+                exit(0)
+            return upa.nnz - granted.nnz
+
         _dupa = 0
         for u in self._users:
             if u not in self._ua.keys():
@@ -326,6 +1714,9 @@ class Mining:
         return _dupa
 
     def verify(self):
+        if self.sparse_checks:
+            return self._n - grants(self._ua, self._pa).nnz
+
         num_perms = 0
         for u in self._ua.keys():
             prms = set()
@@ -1,6 +1,14 @@
+import os
 import sys
 import time
+import random
+import struct
+from concurrent.futures import ProcessPoolExecutor
 from udcc import *
+from library import ResultCache
+from library import Solution
+from library import CACHE_SUFFIX
+from library import sparse
 
 base_dir = 'decompositions/'
 
@@ -40,62 +48,118 @@ decomp_names = ['_optimal_cover.txt',
                 '_obmd.txt',
                 '_biclique.txt']
 
+_bases = dict()   # datasets loaded by this process (see run_cell)
+_states = dict()  # decompositions loaded by this process (see run_cell)
+
+
+def _attach(bases, states):
+    # initializer of the workers: datasets and decompositions published in shared memory are loaded
+    # once per worker, then the cells it runs start from them (see run_cell). Each worker keeps its
+    # own copy of them, the blocks just spare it parsing the files (see SharedArrays)
+    for dataset, shared in bases.items():
+        _bases[dataset] = Mining.load_base(shared)
+        shared.close()
+    for key, shared in states.items():
+        _states[key] = POST(shared)
+        shared.close()
+
+
+# run a single cell of the tables: heuristic 'A1' (UDCC_1), 'A2' (UDCC_2), 'd' (POST_UDCC on the
+# starting decomposition) or 'r' (POST_UDCC on the reduced decomposition). Datasets and
+# decompositions are loaded once per process (from shared memory for a pool of workers, see
+# test_udcc), and each cell starts from a copy of them made before its time is taken.
+# Returns number of roles, WSC and execution time (microseconds of process time), followed by the
+# mined UA, PA and DUPA if solution=True
+def run_cell(dataset, mur, heuristic, decomposition=None, solution=False):
+    if decomposition and dataset == 'customer' and 'optimal' in decomposition:
+        return 0, 0, 0
+
+    if decomposition is None:
+        if dataset not in _bases:
+            _bases[dataset] = Mining.load_base('datasets/' + dataset + '.txt')
+        base = _bases[dataset]
+    else:
+        if dataset + decomposition not in _states:
+            _states[dataset + decomposition] = POST(base_dir + dataset + decomposition)
+        base = _states[dataset + decomposition]
+
+    if heuristic == 'A1':
+        state = UDCC_1.from_base(base, mur)
+    elif heuristic == 'A2':
+        state = UDCC_2.from_base(base, mur)
+    else:
+        state = POST_UDCC(base, mur, heuristic == 'r')  # 'r': remove redundant/unused roles
+    start = time.process_time_ns()
+    state.mine()
+    span = time.process_time_ns() - start
+    wsc, nr, _, _ = state.get_wsc()
+    if solution:
+        return nr, wsc, span // 1000, state._ua, state._pa, getattr(state, '_dupa', None)
+    return nr, wsc, span // 1000
+
+
+# key of the cell in cache (see ResultCache), None for the cells that are not run
+def cell_key(cache, dataset, mur, heuristic, decomposition=None):
+    if decomposition and dataset == 'customer' and 'optimal' in decomposition:
+        return None
+    if decomposition is None:
+        return cache.key('datasets/' + dataset + '.txt', UDCC_1 if heuristic == 'A1' else UDCC_2, mur=mur)
+    return cache.key(base_dir + dataset + decomposition, POST_UDCC, mur=mur, reduce=heuristic == 'r')
+
+
 # if heuristics='both', then test_udcc executes the heuristics first on the starting decomposition
-# and then on the reduced decomposition
-def test_udcc(dataset, decompositions, murs, heuristics='reduced', output='terminal'):
+# and then on the reduced decomposition. With workers > 1 the cells of the tables are run by a pool
+# of processes, the tables are the same as the ones computed by a single process. If a cache is given
+# (see ResultCache), only the cells whose result is not in cache are run
+def test_udcc(dataset, decompositions, murs, heuristics='reduced', output='terminal', workers=1, cache=None):
     all_wsc = ''
     all_nr = ''
     all_time = ''
-    starting_dataset = 'datasets/' + dataset + '.txt'
-    for mur in murs:
-        print('mur:', mur)
-        l_nr = list()
-        l_wsc = list()
-        l_time = list()
-        start = time.process_time_ns()
-        state = UDCC_1(starting_dataset, mur)
-        state.mine()
-        span = time.process_time_ns() - start
-        wsc, nr, _, _ = state.get_wsc()
-        l_nr.append(nr)
-        l_wsc.append(wsc)
-        l_time.append(span // 1000)
+    columns = [('A1', None), ('A2', None)]
+    for decomposition in decompositions:
+        if heuristics == 'both':
+            columns.append(('d', decomposition))
+        columns.append(('r', decomposition))
+    cells = [(dataset, mur, heuristic, decomposition) for mur in murs for heuristic, decomposition in columns]
+    results = [None] * len(cells)
+    if cache is not None:
+        keys = [cell_key(cache, *cell) for cell in cells]
+        for i, key in enumerate(keys):
+            if key is not None and (result := cache.get(key)) is not None:
+                results[i] = (result['nr'], result['wsc'], result['time'])
+    to_run = [i for i, result in enumerate(results) if result is None]
+    cells = [cells[i] + (cache is not None,) for i in to_run]
 
-        start = time.process_time_ns()
-        state = UDCC_2(starting_dataset, mur)
-        state.mine()
-        span = time.process_time_ns() - start
-        wsc, nr, _, _ = state.get_wsc()
-        l_nr.append(nr)
-        l_wsc.append(wsc)
-        l_time.append(span // 1000)
-
-        for decomposition in decompositions:
-            starting_state = base_dir + dataset + decomposition
-            if heuristics == 'both':
-                if dataset == 'customer' and 'optimal' in decomposition:
-                    nr, wsc, span = 0, 0, 0
-                else:
-                    start = time.process_time_ns()
-                    state = POST_UDCC(starting_state, mur)
-                    state.mine()
-                    span = time.process_time_ns() - start
-                    wsc, nr, _, _ = state.get_wsc()
-                l_nr.append(nr)
-                l_wsc.append(wsc)
-                l_time.append(span // 1000)
-
-            if dataset == 'customer' and 'optimal' in decomposition:
-                nr, wsc, span = 0, 0, 0
-            else:
-                start = time.process_time_ns()
-                state = POST_UDCC(starting_state, mur, True)  # remove redundant/unused roles
-                state.mine()
-                span = time.process_time_ns() - start
-                wsc, nr, _, _ = state.get_wsc()
-            l_nr.append(nr)
-            l_wsc.append(wsc)
-            l_time.append(span // 1000)
+    if not cells:
+        computed = list()
+    elif workers > 1:  # the dataset and the decompositions are loaded once, workers share them
+        bases = {dataset: Mining.publish('datasets/' + dataset + '.txt')}
+        states = {dataset + decomposition: POST.publish(base_dir + dataset + decomposition)
+                  for decomposition in decompositions if not (dataset == 'customer' and 'optimal' in decomposition)}
+        try:
+            with ProcessPoolExecutor(workers, initializer=_attach, initargs=(bases, states)) as executor:
+                computed = list(executor.map(run_cell, *zip(*cells)))
+        finally:
+            for shared in list(bases.values()) + list(states.values()):
+                shared.close()
+                shared.unlink()
+    else:
+        computed = [run_cell(*cell) for cell in cells]
+        _bases.clear()
+        _states.clear()
+
+    for i, result in zip(to_run, computed):
+        results[i] = result[:3]
+        if cache is not None and keys[i] is not None:
+            nr, wsc, span, ua, pa, dupa = result
+            cache.put(keys[i], {'nr': nr, 'wsc': wsc, 'time': span, 'ua': ua, 'pa': pa, 'dupa': dupa})
+
+    for m, mur in enumerate(murs):
+        print('mur:', mur)
+        row = results[m * len(columns):(m + 1) * len(columns)]
+        l_nr = [nr for nr, _, _ in row]
+        l_wsc = [wsc for _, wsc, _ in row]
+        l_time = [span for _, _, span in row]
 
         m_nr = min(l_nr)
         s_nr = f'{mur:>4}'
@@ -178,10 +242,464 @@ def test_udcc(dataset, decompositions, murs, heuristics='reduced', output='termi
         sys.stdout = stdout
 
 
+check_datasets = ('hc', 'domino')  # datasets the checks below run on, unless they are given others
+
+
+# run check on each dataset in datasets, each mur that murs selects among the ones of the dataset
+# (see ds_range) and each heuristic in heuristics (key: name - value: function (dataset file, mur)
+# returning a new state). check(dataset file, mur, heuristic) returns whether the run passes and
+# what to print about it. Raises AssertionError if some run does not pass
+def check_runs(datasets, heuristics, check, murs=lambda tics: tics):
+    failed = list()
+    for dataset in datasets:
+        starting_dataset = 'datasets/' + dataset + '.txt'
+        for mur in murs(ds_range[dataset]):
+            for name, heuristic in heuristics.items():
+                ok, row = check(starting_dataset, mur, heuristic)
+                print(f'{dataset:>15} {mur:>5} {name:>12} {row}', 'OK' if ok else 'FAILED')
+                if not ok:
+                    failed.append(f'{dataset} {mur} {name}')
+    assert not failed, 'failed runs: ' + ', '.join(failed)
+
+
+def same_solution(state, other):  # whether the states mined the same UA, PA and DUPA
+    return state._ua == other._ua and state._pa == other._pa and \
+           getattr(state, '_dupa', None) == getattr(other, '_dupa', None)
+
+
+def users_per_role(ua):  # key: role - value: number of users it is assigned to in ua
+    users = dict()
+    for roles in ua.values():
+        for r in roles:
+            users[r] = users.get(r, 0) + 1
+    return users
+
+
+# check that the weighted mode (mining distinct rows carrying multiplicities) mines the same
+# UA, PA and DUPA as the unweighted one, and that the expanded solution satisfies the UDCC
+# constraint. UDCC_2 cuts a permission column larger than mur in rank order rather than in
+# iteration order (see UDCC_2): the test checks it gets the same solution if no column is cut,
+# and otherwise that the solution covers UPA (marked by '*'). It also checks that the
+# heuristics reject the unique mode, whose expanded solutions may exceed mur
+def test_weighted(datasets=check_datasets):
+    for heuristic in (UDCC_1, UDCC_2, STRICT_UDCC):
+        try:
+            heuristic('datasets/' + datasets[0] + '.txt', ds_range[datasets[0]][0], unique=True)
+            rejected = False
+        except Exception:
+            rejected = True
+        print(f'{heuristic.__name__:>12} unique mode', 'OK' if rejected else 'FAILED')
+        assert rejected, heuristic.__name__ + ' accepts the unique mode'
+
+    def check(dataset, mur, heuristic):
+        random.seed(0)
+        state = heuristic(dataset, mur, False)
+        state.mine()
+        random.seed(0)
+        w_state = heuristic(dataset, mur, True)
+        w_state.mine()
+        w_state.expand_solution()
+
+        cut = getattr(w_state, '_column_truncated', False)
+        ok = w_state._check_solution() is True if cut else same_solution(state, w_state)
+        ok = ok and max(users_per_role(w_state._ua).values(), default=0) <= mur
+        return ok, f'{state.get_wsc()[0]:>7} {w_state.get_wsc()[0]:>7}' + (' *' if cut else '')
+
+    check_runs(datasets, {'UDCC_1': lambda d, m, w: UDCC_1(d, m, weighted=w),
+                          'UDCC_2': lambda d, m, w: UDCC_2(d, m, weighted=w),
+                          'STRICT_UDCC': lambda d, m, w: STRICT_UDCC(d, m, access_matrix='unc_upa', weighted=w)},
+               check)
+
+
+# check that POST_UDCC.sweep, run once over all the mur values of a dataset, returns for each mur the
+# same WSC, number of roles, UA and PA as POST_UDCC.mine, on the starting and on the reduced decompositions
+def test_post_sweep(datasets=check_datasets, decompositions=('_biclique.txt', '_obmd.txt', '_unc_row.txt')):
+    sweeps = dict()  # key: (decomposition file, reduce) - value: results of sweep
+
+    def check(dataset, mur, heuristic):
+        decomposition, reduce = heuristic
+        path = base_dir + os.path.basename(dataset)[:-4] + decomposition
+        if (path, reduce) not in sweeps:
+            murs = ds_range[os.path.basename(dataset)[:-4]]
+            sweeps[(path, reduce)] = POST_UDCC(path, murs[0], reduce).sweep(murs, materialize=murs)
+        state = POST_UDCC(path, mur, reduce)
+        state.mine()
+        wsc, nr, _, _ = state.get_wsc()
+        ok = sweeps[(path, reduce)][mur] == (wsc, nr, state._ua, state._pa)
+        return ok, f'{wsc:>7} {sweeps[(path, reduce)][mur][0]:>7}'
+
+    check_runs(datasets, {d[1:-4] + (' r' if r else ' d'): (d, r) for d in decompositions for r in (False, True)},
+               check)
+
+
+# redundant roles of each user as POST_UDCC.redundant_roles found them by comparing every pair of roles
+def pairwise_redundant_roles(ua, pa):
+    redundant = dict()
+    for user, roles in ua.items():
+        to_check = sorted([(r, pa[r]) for r in roles], key=lambda t: len(t[1]))
+        for i in range(len(to_check) - 1):
+            for j in range(i + 1, len(to_check)):
+                if to_check[i][1] <= to_check[j][1]:
+                    if user in redundant:
+                        redundant[user].add(to_check[i][0])
+                    else:
+                        redundant[user] = {to_check[i][0]}
+    return redundant
+
+
+# check that POST_UDCC.redundant_roles, which looks up the containment among roles computed once,
+# finds the same redundant roles as the pairwise scan, on every decomposition of the datasets
+def test_redundant_roles(datasets=check_datasets):
+    def check(dataset, mur, decomposition):
+        path = base_dir + os.path.basename(dataset)[:-4] + decomposition
+        if not os.path.exists(path):
+            return True, 'missing'
+        state = POST_UDCC(path, mur, True)
+        redundant = state.redundant_roles()
+        ok = redundant == pairwise_redundant_roles(state._ua, state._pa)
+        return ok, f'{sum(map(len, redundant.values())):>7}'
+
+    check_runs(datasets, {d[1:-4]: d for d in decomp_names}, check, murs=lambda tics: tics[:1])
+
+
+# check that UDCC.sweep, run once over all the mur values of a dataset, returns for each mur the same
+# WSC, number of roles, UA and PA as an independent run of the heuristic with that mur
+def test_sweep(datasets=check_datasets):
+    sweeps = dict()  # key: (dataset file, heuristic) - value: results of sweep
+
+    def check(dataset, mur, heuristic):
+        if (dataset, heuristic) not in sweeps:
+            murs = ds_range[os.path.basename(dataset)[:-4]]
+            sweeps[(dataset, heuristic)] = heuristic(dataset, murs[0]).sweep(murs, materialize=murs)
+        state = heuristic(dataset, mur)
+        state.mine()
+        wsc, nr, _, _ = state.get_wsc()
+        ok = sweeps[(dataset, heuristic)][mur] == (wsc, nr, state._ua, state._pa)
+        return ok, f'{wsc:>7} {sweeps[(dataset, heuristic)][mur][0]:>7}'
+
+    check_runs(datasets, {'UDCC_1': UDCC_1, 'UDCC_2': UDCC_2}, check)
+
+
+# check that the checks and metrics computed through sparse matrices (see sparse_checks) give the same
+# results as the ones computed through sets, on the mined solution and on solutions broken on purpose:
+# a role missing a permission, a role granting one more permission and a user left without roles
+def test_sparse_checks(datasets=check_datasets):
+    if sparse is None:
+        print('SciPy is not available, no sparse path to compare')
+        return
+
+    def both_paths(state, f):
+        # result of f with sparse checks, if it is the same with sets, on state (or on Solution
+        # if state is None), otherwise a list of both
+        results = list()
+        for flag in (True, False):
+            setattr(state or Solution, 'sparse_checks', flag)
+            results.append(f())
+        if state is None:
+            Solution.sparse_checks = True
+        else:
+            del state.sparse_checks
+        return results[0] if results[0] == results[1] else results
+
+    def missing(state):  # a permission is taken away from a role, the only one granting it to a user
+        for u in sorted(state._ua):
+            for r in sorted(r for r in state._ua[u] if len(state._pa[r]) > 1):
+                others = set(getattr(state, '_dupa', dict()).get(u, ()))
+                for s in state._ua[u] - {r}:
+                    others.update(state._pa[s])
+                if lost := state._pa[r] - others:
+                    state._pa[r] = state._pa[r] - {min(lost)}  # rows are replaced, as they may be shared
+                    return
+
+    def extra(state):  # a role of a user grants a permission the user does not have
+        u = min(state._ua)
+        r = min(state._ua[u])
+        state._pa[r] = state._pa[r] | {min(p for prms in state._upa.values() for p in prms if p not in state._upa[u])}
+
+    def unassigned(state):
+        del state._ua[min(state._ua)]
+
+    def check(dataset, mur, heuristic):
+        ok = True
+        for broken in (None, missing, extra, unassigned):
+            state = heuristic(dataset, mur)
+            state.mine()
+            if isinstance(state, STRICT_UDCC) and broken is unassigned:
+                continue  # users without roles are expected to be covered by DUPA
+            if broken is not None:
+                broken(state)
+            if isinstance(state, POST):
+                ok = ok and both_paths(state, state.check_solution) is (broken is None) and \
+                     (both_paths(state, state._cs) is True) is (broken is None)
+                continue
+            # the broken solutions are found wrong, for the same users
+            solution = Solution.from_dicts(state._ua, state._pa, getattr(state, '_dupa', None))
+            wrong = both_paths(None, lambda: solution.wrong_users(state._upa))
+            ok = ok and isinstance(wrong, set) and bool(wrong) is (broken is not None)
+            if isinstance(state, STRICT_UDCC):
+                ok = ok and both_paths(state, state.check_solution) is (broken is None)
+            else:
+                ok = ok and (both_paths(state, state._check_solution) is True) is (broken is None) and \
+                     isinstance(both_paths(state, state.verify), int)
+                if broken is not extra:  # get_dupa exits if roles grant permissions not in UPA
+                    ok = ok and isinstance(both_paths(state, state.get_dupa), int)
+        return ok, ''
+
+    check_runs(datasets, {'UDCC_1': UDCC_1,
+                          'STRICT_UDCC': lambda d, m: STRICT_UDCC(d, m, access_matrix='unc_upa'),
+                          'POST_UDCC': lambda d, m: POST_UDCC(base_dir + os.path.basename(d)[:-4] + '_obmd.txt', m)},
+               check, murs=lambda tics: tics[::4])
+
+
+# check that mining the connected components of the datasets in parallel (see Mining.mine_components)
+# gets solutions covering UPA and satisfying the UDCC constraint. UDCC_1 makes the same choices in
+# each component as on the whole dataset, hence for it the test also checks the WSC is the same.
+# The merged state is then updated (see Mining.update) by a new user having the permissions of a role
+# assigned to mur users, if any: the role cannot be assigned to it, the update has to mine new ones.
+# The default dataset has many components (apj: 77), so that they are mined by the pool and merged
+def test_components(datasets=('apj',), workers=4):
+    def check(dataset, mur, heuristic):
+        state = heuristic(dataset, mur)
+        state.mine()
+        c_state = heuristic.mine_components(dataset, mur, workers=workers)
+        parts = len(c_state.components())
+
+        ok = c_state.check_solution() if heuristic is STRICT_UDCC else c_state._check_solution() is True
+        ok = ok and max(c_state._registry.au.values()) <= mur
+        if heuristic is UDCC_1:
+            ok = ok and state.get_wsc() == c_state.get_wsc()
+
+        au = c_state._registry.au
+        full = {frozenset(c_state._pa[r]) for r, n in au.items() if n >= mur}
+        ok = ok and (c_state._registry._forbidden == full if heuristic is STRICT_UDCC else not c_state._registry._forbidden)
+        if not ok:  # an inconsistent merged state may never get the update done
+            return ok, f'{parts:>4} {state.get_wsc()[0]:>7} {c_state.get_wsc()[0]:>7}'
+        r = max(au, key=lambda r: (au[r], -r))
+        upa = {u: set(prms) for u, prms in c_state._upa.items()}
+        upa[max(upa) + 1] = set(c_state._pa[r])
+        c_state.update(added=[(max(upa), p) for p in c_state._pa[r]])
+        ok = ok and c_state.solution().check(upa) and max(users_per_role(c_state._ua).values()) <= mur
+        return ok, f'{parts:>4} {state.get_wsc()[0]:>7} {c_state.get_wsc()[0]:>7}'
+
+    check_runs(datasets, {'UDCC_1': UDCC_1, 'UDCC_2': UDCC_2, 'STRICT_UDCC': STRICT_UDCC}, check,
+               murs=lambda tics: tics[::4])
+
+
+# check that instrumented runs (see Mining.instrument) mine the same UA and PA as plain ones, and
+# export their summary as JSON to the folder stats (if given)
+def test_instrument(datasets=check_datasets, stats=None):
+    def check(dataset, mur, heuristic):
+        random.seed(0)
+        state = heuristic(dataset, mur)
+        state.mine()
+        random.seed(0)
+        i_state = heuristic(dataset, mur)
+        progress = list()
+        run_stats = i_state.instrument(lambda users, wsc: progress.append((users, wsc)))
+        i_state.mine()
+
+        if stats is not None:
+            run_stats.dump(f'{stats}/{os.path.basename(dataset)[:-4]}_{heuristic.__name__}.json')
+        ok = state._ua == i_state._ua and state._pa == i_state._pa and progress[-1] == (0, state.get_wsc()[0])
+        return ok, f'{run_stats.timers["mine"]:>8.3f} {run_stats.counters}'
+
+    check_runs(datasets, {'UDCC_1': UDCC_1, 'UDCC_2': UDCC_2, 'STRICT_UDCC': STRICT_UDCC}, check,
+               murs=lambda tics: tics[:1])
+
+
+# check that writing checkpoints (see Mining.checkpoints) leaves a run as it is, i.e., it mines the
+# same UA, PA and DUPA as the same run without checkpoints, and that a run interrupted after some
+# iterations and resumed from its last checkpoint mines a solution covering UPA and satisfying the
+# UDCC constraint. Resumed runs may break ties differently (see Mining.resume), those getting the
+# same solution as the run not interrupted are marked by '='
+def test_checkpoint(datasets=check_datasets, every=10, interrupt=25, path='checkpoint.bin'):
+    # runs interrupted after some iterations and resumed from their checkpoints by a new state on
+    # the same dataset (see Mining.resume), the last checkpoint being cut short by the interruption:
+    # they have to mine exactly what the run without checkpoints mines, as the runs that complete
+    # and are then updated once resumed do
+    class Interrupted(Exception):
+        pass
+
+    def interrupt_run(users, wsc):
+        calls.append(users)
+        if len(calls) == interrupt:
+            raise Interrupted()
+
+    def same_run(state, other):  # the same solution, the users given roles in the same order
+        return same_solution(state, other) and list(state._ua) == list(other._ua) and \
+               state.get_wsc() == other.get_wsc()
+
+    def check(dataset, mur, heuristic):
+        random.seed(0)
+        state = heuristic(dataset, mur)
+        state.mine()
+
+        random.seed(0)
+        c_state = heuristic(dataset, mur)
+        c_state.checkpoints(path, every)
+        c_state.mine()
+        ok = same_run(state, c_state)
+
+        random.seed(0)
+        i_state = heuristic(dataset, mur)
+        i_state.checkpoints(path, every)
+        calls.clear()
+        i_state.instrument(interrupt_run)
+        try:
+            i_state.mine()
+        except Interrupted:
+            pass
+        with open(path, 'ab') as f:
+            f.write(struct.pack('<Q', 1000) + b'cut')
+        r_state = heuristic(dataset, mur)
+        r_state.resume(path)
+        ok = ok and same_run(state, r_state)
+
+        if state._weighted:  # no updates (see Mining.update)
+            return ok, f'{state.get_wsc()[0]:>7}'
+
+        # a completed run, updated and then resumed
+        random.seed(0)
+        c_state = heuristic(dataset, mur)
+        c_state.checkpoints(path, every)
+        c_state.mine()
+        u = min(c_state._upa)
+        c_state.update(added=[(u, p) for p in sorted(c_state._pua)[:2]], removed=[(u, min(c_state._upa[u]))])
+        random.seed(1)  # resume has to restore it
+        r_state = heuristic(dataset, mur)
+        r_state.resume(path)
+        ok = ok and same_run(c_state, r_state)
+        return ok, f'{state.get_wsc()[0]:>7} {c_state.get_wsc()[0]:>7}'
+
+    calls = list()
+    try:
+        check_runs(datasets, {'UDCC_1': lambda d, m: UDCC_1(d, m),
+                              'UDCC_2': lambda d, m: UDCC_2(d, m),
+                              'UDCC_2 weighted': lambda d, m: UDCC_2(d, m, weighted=True),
+                              'UDCC_RM_1': lambda d, m: UDCC_RM_1(d, m),
+                              'STRICT_UDCC': lambda d, m: STRICT_UDCC(d, m, access_matrix='unc_upa')},
+                   check, murs=lambda tics: tics[::4])
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def test_solution(datasets=check_datasets, path='solution'):
+    # solutions handed by the heuristics as Solution, written and read back as text and binary
+    def check(dataset, mur, heuristic):
+        base = Mining.load_base(dataset)
+        random.seed(0)
+        state = heuristic(base, mur)
+        state.mine()
+        solution = state.solution()
+        solution.write(path + '.txt')
+        solution.save(path + '.bin')
+        ok = solution.check(base) and solution.get_wsc() == state.get_wsc()
+        for s in (Solution.load(path + '.txt'), Solution.load(path + '.bin')):
+            ok = ok and s.get_ua() == state._ua and s.get_pa() == state._pa and \
+                 s.get_dupa() == getattr(state, '_dupa', dict())
+
+        # POST_UDCC on the solution, as on the decomposition written to path
+        post = POST_UDCC(Solution.load(path + '.bin'), mur)
+        post.mine()
+        post_text = POST_UDCC(path + '.txt', mur)
+        post_text.mine()
+        ok = ok and post.check_solution() and post._ua == post_text._ua and post._pa == post_text._pa
+        return ok, f'{state.get_wsc()[0]:>7} {post.get_wsc()[0]:>7}'
+
+    try:
+        check_runs(datasets, {'UDCC_1': lambda d, m: UDCC_1(d, m),
+                              'UDCC_2': lambda d, m: UDCC_2(d, m, weighted=True),
+                              'STRICT_UDCC': lambda d, m: STRICT_UDCC(d, m, access_matrix='unc_upa')},
+                   check, murs=lambda tics: tics[::4])
+    finally:
+        for f in (path + '.txt', path + '.txt' + CACHE_SUFFIX, path + '.bin'):  # the cache is written by POST
+            if os.path.exists(f):
+                os.remove(f)
+
+
+def test_update(datasets=check_datasets, steps=5, pairs=5):
+    # mined states updated by batches of random grants and revocations (see Mining.update): the
+    # solution has to grant exactly the updated UPA, with at most mur users per role. With mur=1,
+    # STRICT_UDCC forbids each role it assigns: a revocation emptying it has to drop the role, and
+    # no set of permissions may stay forbidden without a role at mur, as when STRICT_UDCC_REDUCE
+    # removes redundant roles
+    def stale(state, mur):  # sets of permissions forbidden without a role at mur
+        full = {frozenset(state._pa[k]) for k, n in state._registry.au.items() if n >= mur}
+        return state._registry._forbidden - full
+
+    def check(dataset, mur, heuristic):
+        base = Mining.load_base(dataset)
+        random.seed(0)
+        state = heuristic(base, mur)
+        state.mine()
+        ok = not stale(state, mur)
+        rng = random.Random(0)
+        upa = {u: set(prms) for u, prms in base._upa.items()}  # expected UPA
+        users = sorted(upa)
+        permissions = sorted(base._pua)
+        for _ in range(steps):
+            removed = [(u, rng.choice(sorted(upa[u]))) for u in rng.sample(sorted(upa), pairs)]
+            added = [(rng.choice(users), rng.choice(permissions)) for _ in range(pairs)]
+            for u, p in removed:
+                upa[u].discard(p)
+                if not upa[u]:
+                    del upa[u]
+            for u, p in added:
+                upa.setdefault(u, set()).add(p)
+            state.update(added, removed)
+
+        au = users_per_role(state._ua)
+        ok = ok and not stale(state, mur) and state.solution().check(upa) and set(au) == set(state._pa) and \
+             max(au.values()) <= mur and state.get_wsc()[0] == len(state._pa) + \
+             sum(map(len, state._ua.values())) + sum(map(len, state._pa.values()))
+        if isinstance(state, STRICT_UDCC):  # no duplicated roles
+            ok = ok and len(set(map(frozenset, state._pa.values()))) == len(state._pa)
+        return ok, f'{state.get_wsc()[0]:>7}'
+
+    def check_emptied(dataset, mur, heuristic):
+        base = Mining.load_base(dataset)
+        state = heuristic(base, mur)
+        state.mine()
+        r = min(state._pa)
+        u = next(u for u, roles in state._ua.items() if r in roles)
+        p = min(state._pa[r])
+        upa = {v: set(prms) for v, prms in base._upa.items()}
+        upa[u].discard(p)
+        state.update(removed=[(u, p)])
+        ok = state.solution().check({v: prms for v, prms in upa.items() if prms}) and \
+             r not in state._pa and not stale(state, mur)
+        return ok, f'{state.get_wsc()[0]:>7}'
+
+    check_runs(datasets, {'UDCC_1': lambda d, m: UDCC_1(d, m),
+                          'UDCC_2': lambda d, m: UDCC_2(d, m),
+                          'STRICT_UDCC': lambda d, m: STRICT_UDCC(d, m, access_matrix='unc_upa'),
+                          'STRICT_REDUCE': lambda d, m: STRICT_UDCC_REDUCE(d, m, access_matrix='upa')},
+               check, murs=lambda tics: tics[::4])
+    check_runs(datasets, {'STRICT_UDCC': lambda d, m: STRICT_UDCC(d, m, access_matrix='unc_upa')},
+               check_emptied, murs=lambda tics: (1,))
+
+
+test_udcc.__test__ = False  # it prints the tables rather than checking something (see checks)
+checks = (test_weighted, test_post_sweep, test_sweep, test_redundant_roles, test_sparse_checks, test_components, test_instrument, test_checkpoint, test_solution, test_update)
+
 
 if __name__ == '__main__':
     pass
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    if '--checks' in sys.argv:  # run the checks (on the datasets in args, if any), e.g., --checks hc fire1
+        failed = list()
+        for check in checks:
+            try:
+                check(args) if args else check()
+            except AssertionError as error:
+                print(check.__name__, 'FAILED:', error)
+                failed.append(check.__name__)
+        print('checks failed:', ', '.join(failed) if failed else 'none')
+        sys.exit(1 if failed else 0)
+    workers = int(args[0]) if args else 1  # number of processes running the experiments
+    cache = ResultCache() if '--cache' in sys.argv else None  # reuse the results of earlier runs
     for ds_name, tics in ds_range.items():
         print(ds_name, tics)
         if 'hc' in ds_name:
-            test_udcc(ds_name, decomp_names, tics, output='terminal')
\ No newline at end of file
+            test_udcc(ds_name, decomp_names, tics, output='terminal', workers=workers, cache=cache)
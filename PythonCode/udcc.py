@@ -3,16 +3,35 @@ import random
 from copy import deepcopy
 from library import POST
 from library import Mining
+from library import LazyHeap
+from library import SupersetIndex
 
 
 class POST_UDCC(POST):
+    _phases = {'mine': None,
+               'redundant_roles': None,
+               'remove_redundant_roles': None,
+               'remove_unused_roles': None,
+               '_update_ur': None,
+               '_split_roles': None}
+    _counters = ('roles_created',)
+
     def __init__(self, state, mur, reduce=False):
         super().__init__(state)
         self._ur = dict()  # key: role - values: users assigned to key
         self._mur = mur  # maximum users per role
         self._reduce = reduce
-        self._ua = deepcopy(self._orig_ua)
-        self._pa = deepcopy(self._orig_pa)
+        # ua and pa share the rows of the original state, which are never modified: rows of ua are
+        # replaced when roles are (re)assigned
+        self._ua = dict(self._orig_ua)
+        self._pa = dict(self._orig_pa)
+        self._ua_size = sum(map(len, self._ua.values()))
+        self._pa_size = sum(map(len, self._pa.values()))
+        for r, prms in self._pa.items():
+            self._registry.add(r, prms)
+        for roles in self._ua.values():
+            for r in roles:
+                self._registry.assign(r)
 
     def _update_ur(self):
         for user, roles in self._ua.items():
@@ -22,18 +41,38 @@ class POST_UDCC(POST):
                 else:
                     self._ur[r].append(user)
 
+    def _containment(self):
+        # key: role - value: roles whose permissions strictly contain the ones of key. Candidates
+        # are found by intersecting, as bitmasks, the roles granting each permission of key
+        granted = dict()  # key: permission - value: bitmask of the roles granting key
+        for r, prms in self._pa.items():
+            for p in prms:
+                granted[p] = granted.get(p, 0) | 1 << r
+        index = SupersetIndex(granted, True)
+        return {r: {s for s in index.query(prms) if len(self._pa[s]) > len(prms)} for r, prms in self._pa.items()}
+
     def redundant_roles(self):
+        # a role of a user is redundant if its permissions are contained in the ones of another
+        # role of the user. Roles are checked by size (ties broken by the iteration order of the
+        # user's roles), so among roles having the same permissions only the last one is kept
         self._redundant = dict()
+        containing = self._containment()
         for user, roles in self._ua.items():
-            to_check = sorted([(r, self._pa[r]) for r in roles], key=lambda t: len(t[1]))
-            # print(user, to_check)
-            for i in range(len(to_check) - 1):
-                for j in range(i + 1, len(to_check)):
-                    if to_check[i][1] <= to_check[j][1]:
-                        if user in self._redundant:
-                            self._redundant[user].add(to_check[i][0])
-                        else:
-                            self._redundant[user] = {to_check[i][0]}
+            same = dict()  # key: permissions - value: roles of user having them
+            redundant = list()
+            for r in roles:
+                if not containing[r].isdisjoint(roles):
+                    redundant.append(r)
+                key = frozenset(self._pa[r])
+                if key in same:
+                    same[key].append(r)
+                else:
+                    same[key] = [r]
+            for rs in same.values():
+                redundant.extend(rs[:-1])
+            if redundant:
+                redundant.sort(key=lambda r: len(self._pa[r]))
+                self._redundant[user] = set(redundant)
 
         return self._redundant
 
@@ -41,6 +80,11 @@ class POST_UDCC(POST):
         for user, roles in self._redundant.items():
             if not (roles <= self._ua[user]):
                 print('ERROR!!!!')
+            for r in roles & self._ua[user]:
+                self._registry.assign(r, -1)
+                if self._registry.au[r] < self._mur:  # forbidden roles (see STRICT_UDCC) can be assigned again
+                    self._registry.allow(self._pa[r])
+                self._ua_size -= 1
             self._ua[user] = self._ua[user] - roles
 
     def unused_roles(self):
@@ -52,50 +96,107 @@ class POST_UDCC(POST):
 
     def remove_unused_roles(self, to_remove):
         for role in to_remove:
+            self._pa_size -= len(self._pa[role])
             del self._pa[role]
+            self._registry.remove(role)
 
-    def mine(self):
+    def _reduce_roles(self):
         if self._reduce:  # first remove reduntant roles then remove, if any, unused roles
             if self.redundant_roles():
                 self.remove_redundant_roles()
                 if u_r := self.unused_roles():
                     self.remove_unused_roles(u_r)
 
-        self._update_ur()
-        nr = max(self._pa.keys())
+    def _split_roles(self, mur, ua, pa, registry=None):
+        # replace each role assigned to more than mur users (see _update_ur) by copies assigned to at
+        # most mur users, updating ua and pa (and registry, if any). Returns the number of entries
+        # added to pa (|ua| does not change)
+        nr = max(pa.keys())
+        added = 0
         for role, users in self._ur.items():
-            if len(users) > self._mur:
+            if len(users) > mur:
                 i_u = 0  # number of users for which we modified the role assignments
-                for u in users[self._mur:]:
-                    self._ua[u].remove(role)
-                    if i_u % self._mur == 0:
+                for u in users[mur:]:
+                    ua[u] = ua[u] - {role}
+                    if registry is not None:
+                        registry.assign(role, -1)
+                    if i_u % mur == 0:
                         nr += 1
-                        self._pa[nr] = deepcopy(self._pa[role])
+                        pa[nr] = pa[role]
+                        added += len(pa[nr])
+                        if self._stats is not None:
+                            self._stats.count('roles_created')
+                        if registry is not None:
+                            registry.add(nr, pa[nr])
                     i_u += 1
-                    self._ua[u].add(nr)
+                    ua[u].add(nr)
+                    if registry is not None:
+                        registry.assign(nr)
+        return added
+
+    def mine(self):
+        self._reduce_roles()
+        self._update_ur()
+        self._pa_size += self._split_roles(self._mur, self._ua, self._pa, self._registry)
+
+    def sweep(self, murs, materialize=()):
+        # results of mine for each mur in murs, in one pass (to be called instead of mine): roles are
+        # reduced just once, then a role assigned to n > mur users gets (n - 1) // mur copies.
+        # Returns a dictionary (mur, (wsc, nr, ua, pa)), ua and pa being None unless mur is in materialize
+        self._reduce_roles()
+        self._update_ur()
+        _, nroles, ua_size, pa_size = self.get_wsc()
+        split = sorted(((len(users), len(self._pa[role])) for role, users in self._ur.items()), reverse=True)
+
+        results = dict()
+        for mur in murs:
+            nr = nroles
+            size = pa_size
+            for n_users, n_prms in split:
+                if n_users <= mur:
+                    break
+                nr += (n_users - 1) // mur
+                size += (n_users - 1) // mur * n_prms
+            ua = pa = None
+            if mur in materialize:
+                ua = dict(self._ua)  # rows are replaced by _split_roles, the ones of self are left as they are
+                pa = dict(self._pa)
+                self._split_roles(mur, ua, pa)
+            results[mur] = (nr + ua_size + size, nr, ua, pa)
+        return results
 
 
 class STRICT_UDCC(Mining):
-    def __init__(self, dataset, mur, access_matrix='upa', criterion='min', num_iter=10):
-        super().__init__(dataset)
-        self._mur = len(self._users) if mur == 0 else mur  # maximum users per role
+    _phases = dict(Mining._phases, _split='split_attempts')
+    _counters = ('random_split_attempts', 'dupa_fallbacks')
+
+    def __init__(self, dataset, mur, access_matrix='upa', criterion='min', num_iter=10, unique=False, weighted=False):
+        if unique:  # a role of a collapsed user goes to all its copies, which may exceed mur
+            raise Exception('Mining error: unique mode does not bound users per role, use weighted=True')
+        super().__init__(dataset, unique, weighted)
+        self._mur = self._weight(self._users) if mur == 0 else mur  # maximum users per role
         self._num_iter = num_iter  # number of times the heuristic tries to generate pair of roles (see _split)
-        self._au = dict()  # key: role - value: number of users assogned to key
-        self._forbidden_roles = list()  # role assigned to mur users
+        self._au = self._registry.au  # key: role - value: number of users assogned to key
         self._dupa = dict()  # direct user-to-permission assignment
+        self._dupa_size = 0  # |DUPA|, kept up to date as DUPA grows (see get_dupa)
+        self._anchored = dict()  # key: permission - value: mined roles whose rarest permission is key
 
         # use the original UPA or the entries left uncovered in UPA
         self._matrix = self._upa if access_matrix == 'upa' else self._unc_upa
 
         # select the minimum weight row (criterion ='min') or the maximum weight row
-        self._selection = min if criterion == 'min' else max
+        self._criterion = criterion
+        self._init_heaps()
+
+    def _init_heaps(self):
+        self._user_heap = LazyHeap(self._unc_users, lambda u: len(self._matrix[u]), self._unc_rank, self._criterion)
 
     def _pick_role(self):
         # select a pair (user, role) according the fixed criterion in the specified access_matrix
-        u, prms = self._selection([(u, self._matrix[u]) for u in self._unc_users],
-                                  key=lambda t: len(t[1]))
-        prms = self._unc_upa[u]
-        if prms not in self._forbidden_roles:
+        g = self._user_heap.top()
+        u = self._representative(g)
+        prms = self._unc_upa[g]
+        if not self._registry.is_forbidden(prms):
             to_return = [u, prms]  # return user and role
         else:  # split the role as it already reached the UDCC constraint (i.e., mur)
             # print('FORBIDEN ROLE', prms)
@@ -109,31 +210,75 @@ class STRICT_UDCC(Mining):
 
         return to_return
 
+    def _anchor(self, r):
+        # anchor the role r to its rarest permission (see _contained_roles)
+        anchor = min(self._pa[r], key=lambda p: len(self._pua[p]))
+        if anchor in self._anchored:
+            self._anchored[anchor].append(r)
+        else:
+            self._anchored[anchor] = [r]
+
+    def _contained_roles(self, prms):
+        # mined roles (by increasing index) that are a proper subset of prms and can be assigned
+        # to further users. A role contained in prms is anchored to a permission in prms, hence
+        # only such roles are checked
+        contained = list()
+        for p in prms:
+            for r in self._anchored.get(p, ()):
+                if self._pa[r] < prms and self._au[r] < self._mur:
+                    contained.append(r)
+        return sorted(contained)
+
+    def _covering_pair(self, prms, contained):
+        # among the pairs (i, j), i < j, of contained roles whose union is prms, the first one
+        # (in order of i, then j) with least sum of assigned users, None if there is no such pair.
+        # Roles j covering prms - contained[i] are found by intersecting the bitmasks (over the
+        # positions in contained) of the roles granting each permission in prms - contained[i]
+        granted = dict()  # key: permission - value: bitmask of the contained roles granting key
+        by_au = dict()  # key: number of assigned users - value: bitmask of the contained roles having it
+        for i, r in enumerate(contained):
+            for p in self._pa[r]:
+                granted[p] = granted.get(p, 0) | 1 << i
+            by_au[self._au[r]] = by_au.get(self._au[r], 0) | 1 << i
+        aus = sorted(by_au)
+
+        best = None
+        for i, r in enumerate(contained):
+            if best is not None and self._au[r] + aus[0] >= best[0]:
+                continue
+            candidates = ~((1 << (i + 1)) - 1)  # roles following r
+            for p in prms - self._pa[r]:
+                candidates &= granted.get(p, 0)
+                if not candidates:
+                    break
+            else:
+                for au in aus:
+                    if best is not None and self._au[r] + au >= best[0]:
+                        break
+                    found = candidates & by_au[au]
+                    if found:  # the first such role
+                        best = (self._au[r] + au, i, (found & -found).bit_length() - 1)
+                        break
+        return None if best is None else (self._pa[contained[best[1]]], self._pa[contained[best[2]]])
+
     def _split(self, prms):
         # any considered role is a proper subset of prms
-        all_contained_roles = [(role, self._au[r]) for r, role in self._pa.items()
-                               if role < prms and self._au[r] < self._mur]
+        contained = self._contained_roles(prms)
 
         # first check pairs of existing roles satisfying the UDCC constraint
-        to_check = list()
-        for i in range(len(all_contained_roles) - 1):
-            for j in range(i + 1, len(all_contained_roles)):
-                if all_contained_roles[i][0].union(all_contained_roles[j][0]) == prms:
-                    to_check.append((all_contained_roles[i][0], all_contained_roles[j][0],
-                                     all_contained_roles[i][1] + all_contained_roles[j][1]))
+        to_return = self._covering_pair(prms, contained)
 
         # If no pair of existing roles covers prms, consider any contained role
         # in prms and its complement with respect to prms. Consider the complement
-        # only if it is not a mined role (i.e., it does not appear in PA)
-        if not to_check:
-            for (role, nau) in all_contained_roles:
-                if prms - role not in self._pa.values():
-                    to_check.append((role, prms - role, nau))
-
-        if to_check:
-            # If some roles pair has been found, take the one with least sum mur values (i.e., min nau)
-            to_return = min(to_check, key=lambda t: t[2])[:2]  # take the first two elements (i.e., the roles)
-        else:
+        # only if it is not a mined role (i.e., it does not appear in PA). Take the
+        # first one with least number of assigned users
+        if to_return is None:
+            for r in sorted(contained, key=self._au.__getitem__):
+                if prms - self._pa[r] not in self._registry:
+                    to_return = (self._pa[r], prms - self._pa[r])
+                    break
+
+        if to_return is None:
             # try num_iter times to generate two random new roles covering prms
             i = 0
             while i < self._num_iter:
@@ -142,23 +287,22 @@ class STRICT_UDCC(Mining):
                 r1 = set(random.sample(list(prms), np))
                 r2 = prms - r1
 
-                if r1 in self._pa.values() or r2 in self._pa.values():
+                if r1 in self._registry or r2 in self._registry:
                     continue  # if either r1 or2 already has been mined, try again
                 else:
                     to_return = [r1, r2]
                     break
             else:  # If roles generation fails num_iter times, give up and handle prms by DUPA
                 to_return = [None, None]  # no roles found
+            if self._stats is not None:
+                self._stats.count('random_split_attempts', i)
 
         # print('SPLIT:', to_return)
         return to_return
 
     def _update_ua_pa(self, u_to_add, prms):  # _u_ is not used
-        usrs = set()
         # Look for role's index, if any
-        idx = 0
-        if in_pa := [r for (r, role) in self._pa.items() if role == prms]:
-            idx = in_pa[0]
+        idx = self._registry.find(prms)
 
         '''
         if idx:
@@ -175,49 +319,72 @@ class STRICT_UDCC(Mining):
             self._k += 1
             idx = self._k
             self._pa[idx] = deepcopy(prms)
-            self._au[idx] = 0
+            self._pa_size += len(prms)
+            self._registry.add(idx, prms)
+            self._anchor(idx)
 
         # users possessing all permissions in prms some of that have not been covered yet
-        user_to_consider = [usr for usr in self._unc_users if prms.issubset(self._upa[usr]) and
-                            prms.intersection(self._unc_upa[usr])]
+        user_to_consider = [usr for usr in self._superset_users(prms, 'upa') if prms.intersection(self._unc_upa[usr])]
+        user_to_consider = self._expand_users(user_to_consider)
 
         # Done to add user u_to_add to the set of users the role induced by prms
         user_to_consider.remove(u_to_add)
         user_to_consider.insert(0, u_to_add)
 
+        usrs = list()
         for u in user_to_consider:
             if self._au[idx] < self._mur:
-                usrs.add(u)
+                usrs.append(u)
                 self._au[idx] += 1
-                if u in self._ua:
-                    self._ua[u].add(idx)
-                else:
-                    self._ua[u] = {idx}
 
                 # If the role (prms) at index idx has already reached the maximum number of
                 # allowed users (i.e., mur), then mark it as forbidden and  stop searching for
                 # other usrers to assign prms to
                 if self._au[idx] == self._mur:
-                    self._forbidden_roles.append(self._pa[idx])
+                    self._registry.forbid(self._pa[idx])
                     break
             else:
                 break
 
-        return usrs  # users that have been assigned role induced by prms
+        if self._weighted:  # from now on, handle the rows of the users that got the role
+            usrs = self._regroup(usrs)
+        for u in usrs:
+            if u in self._ua:
+                if idx not in self._ua[u]:
+                    self._ua[u].add(idx)
+                    self._ua_size += 1
+            else:
+                self._ua[u] = {idx}
+                self._ua_size += 1
+
+        return set(usrs)  # users that have been assigned role induced by prms
 
     def mine(self):
         while self._unc_users:
             result = self._pick_role()  # result = [user, r1, r2] (r2 might be not present)
-            u = result[0]
-            if result[1] is not None:  # assign roles to u and to at most mur other users containing them
-                for role in result[1:]:
-                    users = self._update_ua_pa(u, role)
-                    # print('affected users:', users)
-                    self._update_unc(users, role)
-            else:  # assign uncovered permissions through DUPA
-                # print('FILLING DUPA')
+            self._step(*result)
+            if self._checkpoint is not None:
+                self._tick(*result)
+
+    def _step(self, u, *roles):
+        # apply the choices of an iteration (see _pick_role)
+        if roles[0] is not None:  # assign roles to u and to at most mur other users containing them
+            for role in roles:
+                users = self._update_ua_pa(u, role)
+                # print('affected users:', users)
+                self._update_unc(users, role)
+        else:  # assign uncovered permissions through DUPA
+            # print('FILLING DUPA')
+            if self._weighted:
+                u = self._regroup({u}).pop()
+            if u in self._dupa:  # permissions of u changed after it got DUPA (see update)
+                self._dupa[u] = self._dupa[u] | self._unc_upa[u]
+            else:
                 self._dupa[u] = deepcopy(self._unc_upa[u])
-                self._update_unc({u}, self._unc_upa[u])
+            self._dupa_size += len(self._unc_upa[u])
+            if self._stats is not None:
+                self._stats.count('dupa_fallbacks')
+            self._update_unc({u}, self._unc_upa[u])
 
     def check_solution(self):
         covered = True
@@ -226,6 +393,8 @@ class STRICT_UDCC(Mining):
             print(set(self._upa.keys()).symmetric_difference(self._users))
             covered = False
 
+        # users whose permissions are not the expected ones, if they can be found by sparse matrices
+        wrong = self._wrong_users(self._dupa) if self.sparse_checks else None
         for u in self._users:
             if u not in self._ua:
                 if u not in self._dupa:
@@ -236,11 +405,11 @@ class STRICT_UDCC(Mining):
                     print('ERROR: wrong DUPA assignment')
                     covered = False
                     # break
-            else:
+            elif wrong is None or u in wrong:
                 perms = set()
                 for r in self._ua[u]:
                     perms.update(self._pa[r])
-                if u in state._dupa:
+                if u in self._dupa:
                     perms.update(self._dupa[u])
 
                 if perms != self._upa[u]:
@@ -250,11 +419,46 @@ class STRICT_UDCC(Mining):
 
         return covered
 
+    def _merge(self, solutions):
+        unc = self._matrix is self._unc_upa
+        super()._merge(solutions)
+        self._matrix = self._unc_upa if unc else self._upa  # UPA is the expanded one, when users were collapsed
+        self._au = self._registry.au
+        # as if the roles had been mined here: anchored, and forbidden once assigned to mur users
+        self._anchored = dict()
+        for r, prms in self._pa.items():
+            self._anchor(r)
+            if self._au[r] >= self._mur:
+                self._registry.forbid(prms)
+        for _, _, dupa in solutions:
+            self._dupa.update(dupa)
+        self._dupa_size = sum(map(len, self._dupa.values()))
+
+    def expand_solution(self):
+        if (self._unique or self._weighted) and not self._expanded:
+            self._dupa = {v: set(prms) for u, prms in self._dupa.items() for v in self._members[u]}
+            self._dupa_size = sum(map(len, self._dupa.values()))
+        return super().expand_solution()
+
     def get_dupa(self):
-        dupa = 0
-        for u, permissions in self._dupa.items():
-            dupa += len(permissions)
-        return dupa
+        return self._dupa_size
+
+    def _repair(self, u):
+        # removed permissions are taken away from DUPA too, which keeps covering the other ones
+        if u in self._dupa:
+            dupa = self._dupa[u] & self._upa.get(u, set())
+            self._dupa_size -= len(self._dupa[u]) - len(dupa)
+            if dupa:
+                self._dupa[u] = dupa
+            else:
+                del self._dupa[u]
+        return super()._repair(u) - self._dupa.get(u, set())
+
+    def _remove_role(self, r):
+        for p in self._pa[r]:
+            if r in self._anchored.get(p, ()):
+                self._anchored[p].remove(r)
+        super()._remove_role(r)
 
     def verify_dupa_covering(self):
         for u in self._dupa:
@@ -269,6 +473,9 @@ class STRICT_UDCC(Mining):
 
 
 class STRICT_UDCC_REDUCE(STRICT_UDCC, POST_UDCC):
+    _phases = dict(POST_UDCC._phases, **STRICT_UDCC._phases)
+    _counters = STRICT_UDCC._counters
+
     def mine(self):
         super().mine()
         wsc, nr, ua, pa = self.get_wsc()
@@ -285,13 +492,22 @@ class STRICT_UDCC_REDUCE(STRICT_UDCC, POST_UDCC):
         dupa = self.get_dupa()
         print(f'{nr:>5} & {wsc:>7} & {ua:>7} & {pa:>7} & {dupa:>5}')
 
+    def remove_unused_roles(self, to_remove):
+        for role in to_remove:  # also no longer anchored (see STRICT_UDCC._remove_role)
+            self._remove_role(role)
 
 
 # abstract class
 class UDCC(Mining, abc.ABC):
-    def __init__(self, dataset, mur=0):
-        super().__init__(dataset)
-        self._mur = len(self._users) if mur == 0 else mur  # maximum users per role
+    def __init__(self, dataset, mur=0, unique=False, weighted=False):
+        if unique:  # a role of a collapsed user goes to all its copies, which may exceed mur
+            raise Exception('Mining error: unique mode does not bound users per role, use weighted=True')
+        super().__init__(dataset, unique, weighted)
+        self._mur = self._weight(self._users) if mur == 0 else mur  # maximum users per role
+        self._init_heaps()
+
+    def _init_heaps(self):  # set up the heaps (see LazyHeap) _pick_role selects rows from, if any
+        pass
 
     @abc.abstractmethod
     def _pick_role(self):
@@ -300,6 +516,9 @@ class UDCC(Mining, abc.ABC):
     def _update_ua_pa(self, usrs, prms):
         self._k += 1
         self._pa[self._k] = prms
+        self._pa_size += len(prms)
+        self._ua_size += len(usrs)
+        self._registry.add(self._k, prms, self._weight(usrs))
         for u in usrs:
             if u in self._ua:
                 self._ua[u].add(self._k)
@@ -318,75 +537,144 @@ class UDCC(Mining, abc.ABC):
                 if len(self._unc_pua[p]) == 0 and p in self._unc_permissions:
                     del self._unc_pua[p]
                     self._unc_permissions.remove(p)
+        self._update_heaps(usrs, prms)
 
     def mine(self):
         while len(self._unc_users) > 0:
             usrs, prms = self._pick_role()
-            if usrs:
-                self._update_ua_pa(usrs, prms)
-                self._update_unc(usrs, prms)
+            self._step(usrs, prms)
+            if self._checkpoint is not None:
+                self._tick(usrs, prms)
+
+    def _step(self, usrs, prms):
+        # apply the choices of an iteration (see _pick_role): the users selected, listed in the order
+        # the set of them is built from, and the role to assign them
+        if usrs:
+            usrs = set(usrs)
+            if self._weighted:  # from now on, handle the rows of the selected users
+                usrs = self._regroup(usrs)
+            self._update_ua_pa(usrs, prms)
+            self._update_unc(usrs, prms)
+
+    def sweep(self, murs, materialize=()):
+        # results of mine for each mur in murs, the same independent runs would get (to be called
+        # instead of mine). Runs go by increasing mur: a step depends on mur only if some users are
+        # left out because of it (see _expand_users), and up to the first such step a run with a
+        # larger mur makes the same choices. Hence, each run starts from the state the previous
+        # one had at that step. Returns a dictionary (mur, (wsc, nr, ua, pa)), where ua and pa are
+        # None unless mur is in materialize. The sweep saves the steps before the first such step
+        # only: when users are left out early (e.g., UDCC_1 on fire1 or apj) most of each run is
+        # mined again, and a full snapshot of the state is copied for each mur
+        if self._weighted:
+            raise Exception('Sweep error: not available in weighted mode')
+
+        results = dict()
+        snapshot = None
+        for mur in sorted(murs, key=lambda m: m if m else self._weight(self._users)):
+            if snapshot is not None:
+                self._restore(snapshot)
+                snapshot = None
+            self._mur = mur if mur else self._weight(self._users)
+            while len(self._unc_users) > 0:
+                self._truncated = False
+                usrs, prms = self._pick_role()
+                if self._truncated and snapshot is None:
+                    snapshot = self._snapshot()
+                self._step(usrs, prms)
+            wsc, nr, _, _ = self.get_wsc()
+            results[mur] = (wsc, nr, self._ua, self._pa) if mur in materialize else (wsc, nr, None, None)
+        return results
 
 
 class UDCC_1(UDCC):
+    def _init_heaps(self):
+        # uncovered users by number of uncovered permissions, ties broken according to _unc_upa's order
+        self._user_heap = LazyHeap(self._unc_users, lambda u: len(self._unc_upa[u]), self._upa_rank)
+
     def _pick_role(self):
-        u, prms = min(self._unc_upa.items(), key=lambda t: len(t[1]))
+        u = self._user_heap.top()
+        prms = self._unc_upa[u]
 
-        all_usrs = [(u, self._unc_upa[u]) for u in self._unc_users if prms <= self._unc_upa[u]]
+        # the (at most) mur users having most uncovered permissions among those containing prms
+        usrs = self._expand_users(self._superset_users(prms), key=lambda v: -len(self._unc_upa[v]),
+                                  limit=self._mur)
         # try also _unc_upa
         # all_usrs = [(u, self._unc_upa[u]) for u in self._unc_users if prms <= self._upa[u]]
 
-        all_usrs.sort(key=lambda t: len(t[1]), reverse=True)
-        usrs = [t[0] for t in all_usrs]
+        return usrs, prms
+
 
-        if len(usrs) > self._mur:
-            return set(usrs[:self._mur]), prms
+class UDCC_2(UDCC):
+    # Weighted mode: a column larger than mur is cut to the mur users coming first in rank order,
+    # while an unweighted run cuts it in the iteration order of the column. Results are the same
+    # as an unweighted run's as long as no column is cut (_column_truncated stays False)
+    _column_truncated = False
+
+    def _init_heaps(self):
+        self._user_heap = LazyHeap(self._unc_users, lambda u: len(self._unc_upa[u]), self._upa_rank)
+        if self._weighted:  # users in the uncovered columns, kept up to date by _update_unc
+            self._unc_pua_weight = {p: self._weight(usrs) for p, usrs in self._unc_pua.items()}
+            weight = self._unc_pua_weight.__getitem__
         else:
-            return set(usrs), prms
+            weight = lambda p: len(self._unc_pua[p])
+        self._permission_heap = LazyHeap(self._unc_permissions, weight,
+                                         {p: i for i, p in enumerate(self._unc_pua)})
 
+    def _update_unc(self, usrs, prms):
+        if self._weighted:  # groups split by _regroup keep the weight of the columns unchanged
+            for p in prms:
+                if p in self._unc_pua:
+                    self._unc_pua_weight[p] -= self._weight(usrs & self._unc_pua[p])
+        super()._update_unc(usrs, prms)
 
-class UDCC_2(UDCC):
     def _pick_role(self):
-        u, u_min = min(self._unc_upa.items(), key=lambda t: len(t[1]))
-        p, p_min = min(self._unc_pua.items(), key=lambda t: len(t[1]))
+        u = self._user_heap.top()
+        u_min = self._unc_upa[u]
+        p = self._permission_heap.top()
+        if self._weighted:  # u_min <= the users in the groups of the column, without expanding it
+            column = self._unc_pua[p]
+            u_first = all(x in self._group and self._group[x] in column for x in u_min)
+        else:
+            u_first = u_min <= self._unc_pua[p]
 
-        usrs, prms = self._pick_role_u(u) if u_min <= p_min else self._pick_role_p(p)
+        usrs, prms = self._pick_role_u(u) if u_first else self._pick_role_p(p)
 
         return usrs, prms
 
     def _pick_role_u(self, u):  # the selected node is a user
         prms = self._unc_upa[u]
-        usrs = [u for u in self._unc_users if prms <= self._unc_upa[u]]
-        if len(usrs) > self._mur:
-            return set(usrs[:self._mur]), prms
-        else:
-            return set(usrs), prms
+        usrs = self._expand_users(self._superset_users(prms), limit=self._mur)
+        return usrs, prms
 
     def _pick_role_p(self, p):  # the selected node is a permission
-        all_usrs = list(self._unc_pua[p])
-        if len(all_usrs) > self._mur:
-            usrs = set(all_usrs[:self._mur])
-        else:
-            usrs = set(all_usrs)
+        if self._weighted and self._unc_pua_weight[p] > self._mur:
+            self._column_truncated = True
+        usrs = self._expand_users(self._unc_pua[p], limit=self._mur)
 
-        prms = {p for p in self._unc_permissions if usrs <= self._pua[p]}
+        prms = self._superset_permissions(set(usrs))
 
         return usrs, prms
 
 
 class UDCC_RM_1(UDCC):
+    def _init_heaps(self):
+        self._user_heap = LazyHeap(self._unc_users, lambda u: len(self._upa[u]), self._unc_rank)
+
     def _pick_role(self):
-        u, prms = min([(u, self._upa[u]) for u in self._unc_users], key=lambda t: len(t[1]))
+        g = self._user_heap.top()
+        u = self._representative(g)
+        prms = self._upa[g]
         # print(u, prms)
-        all_usrs = {usr for usr in self._unc_users if prms <= self._upa[usr]}
+        expanded = self._expand_users(self._superset_users(prms, 'upa'))
+        all_usrs = set(expanded)
         #print(all_usrs)
         if len(all_usrs) <= self._mur:
-            usrs = all_usrs
+            usrs = expanded
             # print(usrs)
         else:
+            self._truncated = True
             all_usrs.remove(u)
-            new_set = set(list(all_usrs)[:self._mur - 1])
-            new_set.add(u)
-            usrs = new_set
+            usrs = list(all_usrs)[:self._mur - 1] + [u]
             # print(usrs)
 
         #input('xxx')
@@ -394,20 +682,24 @@ class UDCC_RM_1(UDCC):
 
 
 class UDCC_RM_2(UDCC):
+    def _init_heaps(self):
+        self._user_heap = LazyHeap(self._unc_users, lambda u: len(self._unc_upa[u]), self._unc_rank)
+
     def _pick_role(self):
-        u, prms = min([(u, self._unc_upa[u]) for u in self._unc_users], key=lambda t: len(t[1]))
-        all_usrs = {usr for usr in self._unc_users if prms <= self._upa[usr]}
+        g = self._user_heap.top()
+        u = self._representative(g)
+        prms = self._unc_upa[g]
         # print(u, prms)
-        all_usrs = {usr for usr in self._unc_users if prms <= self._upa[usr]}
+        expanded = self._expand_users(self._superset_users(prms, 'upa'))
+        all_usrs = set(expanded)
         # print(all_usrs)
         if len(all_usrs) <= self._mur:
-            usrs = all_usrs
+            usrs = expanded
             #print(usrs)
         else:
+            self._truncated = True
             all_usrs.remove(u)
-            new_set = set(list(all_usrs)[:self._mur - 1])
-            new_set.add(u)
-            usrs = new_set
+            usrs = list(all_usrs)[:self._mur - 1] + [u]
             # print(usrs)
 
         # input('xxx')